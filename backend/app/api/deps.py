@@ -1,9 +1,12 @@
 import uuid
 from typing import Optional
 from fastapi import Depends, Header, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from ..db import get_db
 from ..models import User
+from ..services.identity import cached_user, remember_user
 
 def _validate_uuid_like(value: str) -> None:
     try:
@@ -19,9 +22,24 @@ def get_user_id(user_id: Optional[str] = Header(default=None, alias="user-id"))
     return user_id
 
 def require_user(user_id: str = Depends(get_user_id), db: Session = Depends(get_db)) -> User:
+    user = cached_user(user_id)
+    if user is not None:
+        return user
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=401, detail={"message": "Invalid user-id."})
+    remember_user(user.user_id, user.username)
+    return user
+
+async def require_user_async(user_id: Optional[str], db: AsyncSession) -> User:
+    """`require_user` for routes on the async session."""
+    user = cached_user(user_id)
+    if user is not None:
+        return user
+    user = (await db.execute(select(User).where(User.user_id == user_id))).scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=401, detail={"message": "Invalid user-id."})
+    remember_user(user.user_id, user.username)
     return user
 
 def require_admin() -> None:
@@ -1,11 +1,12 @@
-import shutil, pathlib
 from fastapi import APIRouter, Depends, Body
 from sqlalchemy.orm import Session
 from ..db import get_db
-from ..models import Message, Conversation, FileRecord, User
+from ..models import Message, Conversation, FileRecord, IngestJob, User
 from ..schemas.files import AdminResetBody
 from ..api.deps import require_admin
-from ..services.vectorstore import chroma_client, collection
+from ..services.retrieval import invalidate_all
+from ..services.identity import clear_identity
+from ..services.ingestion import drop_all_chunks
 from ..config import CHROMA_DIR
 
 router = APIRouter(prefix="/v1/admin", tags=["admin"])
@@ -15,7 +16,7 @@ def admin_reset_all(body: AdminResetBody = Body(default=AdminResetBody()),
                     db: Session = Depends(get_db),
                     _admin = Depends(require_admin)):
     deleted = {}
-    for model in [Message, Conversation, FileRecord]:
+    for model in [Message, Conversation, IngestJob, FileRecord]:
         count = db.query(model).delete(synchronize_session=False)
         deleted[model.__tablename__] = count
     if not body.preserve_users:
@@ -23,17 +24,8 @@ def admin_reset_all(body: AdminResetBody = Body(default=AdminResetBody()),
         deleted["users"] = count_users
     db.commit()
 
-    try:
-        chroma_client.reset()
-    except Exception:
-        pass
-
-    chroma_path = pathlib.Path(CHROMA_DIR)
-    if chroma_path.exists():
-        shutil.rmtree(chroma_path, ignore_errors=True)
-    chroma_path.mkdir(parents=True, exist_ok=True)
-
-    global collection  # noqa
-    collection = chroma_client.get_or_create_collection(name="docs", metadata={"hnsw:space": "cosine"})
+    drop_all_chunks()
+    invalidate_all()
+    clear_identity()
 
     return {"status": "ok", "preserve_users": body.preserve_users, "db_deleted": deleted, "chroma_dir": CHROMA_DIR}
@@ -6,6 +6,7 @@ from ..models import User
 from ..schemas.auth import SignUpRequest, SignInRequest
 from ..schemas.common import AuthResponse
 from ..utils.security import hash_password, verify_password
+from ..services.identity import remember_user
 
 router = APIRouter(prefix="/v1/auth", tags=["auth"])
 
@@ -17,6 +18,7 @@ def signup(body: SignUpRequest, db: Session = Depends(get_db)):
     user_id = str(uuid.uuid4())
     user = User(user_id=user_id, username=body.username, password_hash=hash_password(body.password))
     db.add(user); db.commit()
+    remember_user(user_id, body.username)
     return AuthResponse(user_id=user_id)
 
 @router.post("/signin", response_model=AuthResponse)
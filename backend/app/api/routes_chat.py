@@ -1,155 +1,232 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, Tuple
+import json
+import time
 import uuid
 from datetime import datetime
 from fastapi import APIRouter, Depends, Header, HTTPException, Request
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import get_db
+from ..db import get_async_db, AsyncSessionLocal
 from ..models import User, FileRecord, Conversation, Message
-from ..api.deps import require_user
-from ..services.embeddings import embed
-from ..services.vectorstore import collection
+from ..api.deps import require_user_async
+from ..services.retrieval import retrieve
+from ..services.rerank import rerank_order
+from ..services.history import History, load_history
+from ..services.identity import ready_docs_cached, remember_docs
+from ..config import RERANK_ENABLED, RERANK_MAX_CONTEXT
 from ..schemas.chat import (
     ChatRequest,
     ChatResponse,
 )
 from ..services.prompting import build_rag_messages, OOS_REPLY
-from ..services.llm import llm_chat
+from ..services.llm import llm_chat, llm_chat_stream
+from ..utils.timing import add_span, span, current_timings
 
 router = APIRouter(prefix="/v1", tags=["chat"])
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(
-    body: ChatRequest,
-    request: Request,
-    user_id: Optional[str] = Header(default=None, alias="user-id"),
-    db: Session = Depends(get_db),
-):
-    user: User = require_user(user_id, db)
+def _conversation_title(query: str) -> str:
+    return (query[:80] + ("…" if len(query) > 80 else "")) or "Conversation"
 
-    if not body.doc_ids:
-        raise HTTPException(
-            400,
-            detail={
-                "message": "No file selected. Provide one or more doc_ids to chat against."
-            },
-        )
 
-    # Resolve (or create) conversation
-    if body.conversation_id:
+async def _resolve_conversation(
+    db: AsyncSession, user: User, conversation_id: Optional[str]
+) -> Conversation:
+    if conversation_id:
         conv = (
-            db.query(Conversation)
-            .filter(
-                Conversation.id == body.conversation_id,
-                Conversation.user_id == user.user_id,
+            await db.execute(
+                select(Conversation).where(
+                    Conversation.id == conversation_id,
+                    Conversation.user_id == user.user_id,
+                )
             )
-            .first()
-        )
+        ).scalar_one_or_none()
         if not conv:
             raise HTTPException(404, detail={"message": "Conversation not found."})
-    else:
-        conv = Conversation(id=str(uuid.uuid4()), user_id=user.user_id, title=None)
-        db.add(conv)
-        db.commit()
-        db.refresh(conv)
+        return conv
+    conv = Conversation(id=str(uuid.uuid4()), user_id=user.user_id, title=None)
+    db.add(conv)
+    await db.commit()
+    return conv
 
-    # Ownership check for doc_ids
-    owned = (
-        db.query(FileRecord)
-        .filter(FileRecord.user_id == user.user_id, FileRecord.doc_id.in_(body.doc_ids))
-        .count()
-    )
-    if owned != len(body.doc_ids):
+
+async def _check_doc_ownership(db: AsyncSession, user: User, doc_ids: List[str]) -> None:
+    if len(set(doc_ids)) == len(doc_ids) and ready_docs_cached(user.user_id, doc_ids):
+        return
+    # One query for all of the user's documents, cached for the next turns
+    rows = (
+        await db.execute(
+            select(FileRecord.doc_id, FileRecord.status).where(FileRecord.user_id == user.user_id)
+        )
+    ).all()
+    docs = {d: status or "ready" for d, status in rows}
+    remember_docs(user.user_id, docs)
+    owned = [(d, docs[d]) for d in dict.fromkeys(doc_ids) if d in docs]
+    if len(owned) != len(doc_ids):
         raise HTTPException(
             403, detail={"message": "One or more doc_ids do not belong to this user."}
         )
+    not_ready = [d for d, status in owned if status != "ready"]
+    if not_ready:
+        raise HTTPException(
+            409,
+            detail={
+                "message": "One or more documents are still indexing or failed to index.",
+                "not_ready": not_ready,
+            },
+        )
 
-    # Safety clamps for retrieval sizes
-    top_k = max(1, min(int(body.top_k or 12), 50))
-    max_context = max(1, min(int(body.max_context or 6), top_k))
-
-    where_filter = {
-        "$and": [{"user_id": user.user_id}, {"doc_id": {"$in": body.doc_ids}}]
-    }
 
-    # Vector search limited to selected documents only
-    q_vec = embed([body.query])[0]
-    res = collection.query(
-        query_embeddings=[q_vec], n_results=top_k, where=where_filter
-    )
-    docs = res.get("documents", [[]])[0] or []
-    metas = res.get("metadatas", [[]])[0] or []
+async def _retrieve_context(
+    user_id: str, body: ChatRequest, top_k: int, max_context: int
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    # Search limited to selected documents only (vector, lexical or hybrid)
+    docs, metas = await retrieve(user_id, body.doc_ids, body.query, top_k, body.retrieval_mode)
 
-    # Build deduped context and UI sources (preserve order)
+    # Dedupe by exact chunk text, keeping retrieval order
     seen_texts = set()
-    context_chunks: List[str] = []
-    sources: List[Dict[str, str]] = []
+    candidates: List[Tuple[str, Dict[str, Any]]] = []
     for text, meta in zip(docs, metas):
-        if not isinstance(text, str):
-            continue
-        # simple dedupe by exact chunk text; avoids repeated chunks
-        if text in seen_texts:
+        if not isinstance(text, str) or text in seen_texts:
             continue
         seen_texts.add(text)
+        candidates.append((text, meta or {}))
 
-        sources.append(
-            {
-                "snippet": text[:200] + ("..." if len(text) > 200 else ""),
-                "source": (meta or {}).get("source"),
-                "page": (meta or {}).get("page"),
-                "doc_id": (meta or {}).get("doc_id"),
-            }
-        )
+    # Optional cross-encoder pass: a better order lets fewer chunks reach the LLM
+    use_rerank = RERANK_ENABLED if body.rerank is None else body.rerank
+    if use_rerank and len(candidates) > 1:
+        with span("rerank"):
+            order = await rerank_order(body.query, [t for t, _ in candidates])
+        if order is not None:
+            candidates = [candidates[i] for i in order]
+            max_context = min(max_context, max(1, RERANK_MAX_CONTEXT))
+
+    context_chunks: List[str] = []
+    sources: List[Dict[str, Any]] = []
+    for text, meta in candidates[:max_context]:
+        source = {
+            "snippet": text[:200] + ("..." if len(text) > 200 else ""),
+            "source": meta.get("source"),
+            "page": meta.get("page"),
+            "doc_id": meta.get("doc_id"),
+        }
+        if "row_start" in meta:
+            source["rows"] = [meta["row_start"], meta.get("row_end")]
+        sources.append(source)
         context_chunks.append(text)
-        if len(context_chunks) >= max_context:
-            break
+    return context_chunks, sources
+
+
+async def _load_turn_state(
+    body: ChatRequest, user_id: Optional[str], db: AsyncSession
+) -> Tuple[User, Conversation, History]:
+    user: User = await require_user_async(user_id, db)
+
+    if not body.doc_ids:
+        raise HTTPException(
+            400,
+            detail={
+                "message": "No file selected. Provide one or more doc_ids to chat against."
+            },
+        )
+
+    # Resolve (or create) conversation
+    conv = await _resolve_conversation(db, user, body.conversation_id)
 
+    # Ownership check for doc_ids
+    await _check_doc_ownership(db, user, body.doc_ids)
+
+    # Prompt window of earlier turns, read before this turn's message is stored
+    history = await load_history(db, conv, body.history_limit)
+    return user, conv, history
+
+
+async def _persist_user_message(
+    db: AsyncSession, user_id: str, conv_id: str, body: ChatRequest, top_k: int, max_context: int
+) -> None:
     # Persist user message (audit)
     user_msg = Message(
         id=str(uuid.uuid4()),
-        conversation_id=conv.id,
-        user_id=user.user_id,
+        conversation_id=conv_id,
+        user_id=user_id,
         role="user",
         content=body.query,
         meta={"doc_ids": body.doc_ids, "top_k": top_k, "max_context": max_context},
     )
     db.add(user_msg)
-    db.commit()
+    await db.commit()
 
-    # If we have no usable context, return deterministic OOS immediately (no LLM call)
-    if len(context_chunks) == 0:
-        answer = OOS_REPLY
-        asst_msg = Message(
-            id=str(uuid.uuid4()),
-            conversation_id=conv.id,
-            user_id=user.user_id,
-            role="assistant",
-            content=answer,
-            sources=[],
-        )
-        conv.updated_at = datetime.utcnow()
-        if not conv.title:
-            conv.title = (
-                body.query[:80] + ("…" if len(body.query) > 80 else "")
-            ) or "Conversation"
-        db.add(asst_msg)
-        db.commit()
-        return ChatResponse(response=answer, sources=[], conversation_id=conv.id)
 
-    # Build grounded prompt with strict denial & citation rules
-    messages = build_rag_messages(body.query, context_chunks)
+async def _prepare_turn(
+    body: ChatRequest, user_id: Optional[str], db: AsyncSession
+) -> Tuple[str, str, List[str], List[Dict[str, Any]], History]:
+    """
+    Shared front half of a chat turn: auth, conversation, ownership, history
+    window, retrieval, and persisting the user message.
+    Returns (user_id, conv_id, context_chunks, sources, history).
+    DB calls go through the async session; blocking embedding and Chroma
+    calls run on the executor pools.
+    """
+    with span("db"):
+        user, conv, history = await _load_turn_state(body, user_id, db)
+    owner_id, conv_id = user.user_id, conv.id
+
+    # Safety clamps for retrieval sizes
+    top_k = max(1, min(int(body.top_k or 12), 50))
+    max_context = max(1, min(int(body.max_context or 6), top_k))
+
+    with span("retrieve"):
+        context_chunks, sources = await _retrieve_context(owner_id, body, top_k, max_context)
+
+    with span("db"):
+        await _persist_user_message(db, owner_id, conv_id, body, top_k, max_context)
+    return owner_id, conv_id, context_chunks, sources, history
+
 
+async def _persist_answer(
+    db: AsyncSession,
+    user_id: str,
+    conv_id: str,
+    query: str,
+    answer: str,
+    sources: List[Dict[str, Any]],
+) -> None:
+    conv = await db.get(Conversation, conv_id)
+    if conv is None:
+        return
+    asst_msg = Message(
+        id=str(uuid.uuid4()),
+        conversation_id=conv_id,
+        user_id=user_id,
+        role="assistant",
+        content=answer,
+        sources=sources,
+    )
+    conv.updated_at = datetime.utcnow()
+    if not conv.title:
+        conv.title = _conversation_title(query)
+    db.add(asst_msg)
+    await db.commit()
+
+
+async def _persist_answer_detached(
+    conv_id: str, user_id: str, query: str, answer: str, sources: List[Dict[str, Any]]
+) -> None:
+    # The request-scoped session may already be closed once streaming starts
+    async with AsyncSessionLocal() as s:
+        await _persist_answer(s, user_id, conv_id, query, answer, sources)
+
+
+def _llm_kwargs(body: ChatRequest, request: Request) -> Dict[str, Any]:
     # Provider/model overrides & key
     provider_override = getattr(body, "provider", None) or request.headers.get(
         "X-LLM-Provider"
     )
     model_override = getattr(body, "model", None) or request.headers.get("X-LLM-Model")
     openai_key = request.headers.get("X-OpenAI-Key", "")
-
-    # Call LLM
-    answer = await llm_chat(
-        messages,
+    return dict(
         temperature=body.temperature,
         openai_key_header=openai_key,
         provider_override=provider_override,
@@ -160,21 +237,118 @@ async def chat(
         max_output_tokens=getattr(body, "max_output_tokens", 1024),
     )
 
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    body: ChatRequest,
+    request: Request,
+    user_id: Optional[str] = Header(default=None, alias="user-id"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    owner_id, conv_id, context_chunks, sources, history = await _prepare_turn(body, user_id, db)
+
+    # If we have no usable context, return deterministic OOS immediately (no LLM call)
+    if len(context_chunks) == 0:
+        with span("db"):
+            await _persist_answer(db, owner_id, conv_id, body.query, OOS_REPLY, [])
+        return ChatResponse(
+            response=OOS_REPLY, sources=[], conversation_id=conv_id, debug=_debug(body)
+        )
+
+    # Build grounded prompt with strict denial & citation rules
+    with span("prompt"):
+        messages = build_rag_messages(
+            body.query, context_chunks, history=history.turns, summary=history.summary
+        )
+
+    # Call LLM
+    with span("llm"):
+        answer = await llm_chat(messages, **_llm_kwargs(body, request))
+
     # Persist assistant message & update conversation
-    asst_msg = Message(
-        id=str(uuid.uuid4()),
-        conversation_id=conv.id,
-        user_id=user.user_id,
-        role="assistant",
-        content=answer,
-        sources=sources,
+    with span("db"):
+        await _persist_answer(db, owner_id, conv_id, body.query, answer, sources)
+
+    return ChatResponse(
+        response=answer, sources=sources, conversation_id=conv_id, debug=_debug(body)
     )
-    conv.updated_at = datetime.utcnow()
-    if not conv.title:
-        conv.title = (
-            body.query[:80] + ("…" if len(body.query) > 80 else "")
-        ) or "Conversation"
-    db.add(asst_msg)
-    db.commit()
 
-    return ChatResponse(response=answer, sources=sources, conversation_id=conv.id)
+
+def _debug(body: ChatRequest) -> Optional[Dict[str, Any]]:
+    return {"timings": current_timings()} if body.debug else None
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    body: ChatRequest,
+    request: Request,
+    user_id: Optional[str] = Header(default=None, alias="user-id"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Server-Sent Events variant of `/v1/chat`.
+
+    Events, in order:
+      - `sources`: `{"sources": [...], "conversation_id": ...}` right after retrieval
+      - `token`:   `{"delta": "..."}` for every text delta from the provider
+      - `done`:    `{"conversation_id": ...}` once the assistant message is persisted
+                   (plus `debug.timings` with `"debug": true`, including `llm_ttft`)
+      - `error`:   `{"message": ...}` if the provider fails mid-stream
+    """
+    owner_id, conv_id, context_chunks, sources, history = await _prepare_turn(body, user_id, db)
+
+    if context_chunks:
+        with span("prompt"):
+            messages = build_rag_messages(
+                body.query, context_chunks, history=history.turns, summary=history.summary
+            )
+        # Resolve provider/key before the 200 goes out so config errors stay plain HTTP errors
+        deltas = llm_chat_stream(messages, **_llm_kwargs(body, request))
+    else:
+        deltas = None
+
+    async def events():
+        yield _sse("sources", {"sources": sources, "conversation_id": conv_id})
+
+        parts: List[str] = []
+        if deltas is None:
+            # No usable context: deterministic OOS reply (no LLM call)
+            parts.append(OOS_REPLY)
+            yield _sse("token", {"delta": OOS_REPLY})
+        else:
+            try:
+                with span("llm"):
+                    started = time.perf_counter()
+                    async for delta in deltas:
+                        if not parts:
+                            add_span("llm_ttft", time.perf_counter() - started)
+                        parts.append(delta)
+                        yield _sse("token", {"delta": delta})
+            except HTTPException as e:
+                detail = e.detail if isinstance(e.detail, dict) else {"message": str(e.detail)}
+                yield _sse("error", {"status": e.status_code, **detail})
+                return
+            except Exception as e:
+                # The 200 is already out: report anything else as a final event too
+                yield _sse("error", {"status": 500, "message": f"Streaming failed: {type(e).__name__}"})
+                return
+
+        with span("db"):
+            await _persist_answer_detached(
+                conv_id, owner_id, body.query, "".join(parts),
+                sources if deltas is not None else [],
+            )
+        done: Dict[str, Any] = {"conversation_id": conv_id}
+        if body.debug:
+            done["debug"] = {"timings": current_timings()}
+        yield _sse("done", done)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,12 +1,14 @@
 import uuid
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from ..db import get_db
 from ..models import Conversation, Message
 from ..api.deps import require_user
+from ..config import CONVERSATIONS_PAGE_SIZE, MESSAGES_PAGE_SIZE, PAGE_SIZE_MAX
 from ..schemas.conversations import ConversationCreate
 from ..schemas.common import ConversationSummary, ConversationDetail, MessageDTO
+from ..utils.pagination import encode_cursor, before
 
 router = APIRouter(prefix="/v1", tags=["conversations"])
 
@@ -21,40 +23,106 @@ def create_conversation(body: ConversationCreate,
     return ConversationSummary(id=conv.id, title=conv.title,
                                created_at=conv.created_at, updated_at=conv.updated_at)
 
+def _page_limit(limit: Optional[int], cursor: Optional[str], default: int) -> Optional[int]:
+    # Unpaged (the pre-pagination behaviour) unless the client asks for pages
+    if limit is None and cursor:
+        return default
+    return limit
+
+def _fetch_page(q, limit: Optional[int]) -> list:
+    # One extra row tells whether another page exists
+    return (q.limit(limit + 1) if limit is not None else q).all()
+
+def _set_next_cursor(response: Response, rows, limit: Optional[int], ts_attr: str) -> list:
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, ts_attr), last.id)
+    return rows
+
 @router.get("/conversations", response_model=List[ConversationSummary])
-def list_conversations(user_id: Optional[str] = Header(default=None, alias="user-id"),
+def list_conversations(response: Response,
+                       limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+                       cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page."),
+                       user_id: Optional[str] = Header(default=None, alias="user-id"),
                        db: Session = Depends(get_db)):
+    """
+    Most recently updated first. Without `limit` or `cursor` every conversation
+    is returned; with them, pages of `limit` (default CONVERSATIONS_PAGE_SIZE)
+    and the next one announced in `X-Next-Cursor`.
+    """
     user = require_user(user_id, db)
-    rows = (db.query(Conversation)
-            .filter(Conversation.user_id == user.user_id)
-            .order_by(Conversation.updated_at.desc(), Conversation.created_at.desc())
-            .all())
+    limit = _page_limit(limit, cursor, CONVERSATIONS_PAGE_SIZE)
+    q = (db.query(Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at)
+         .filter(Conversation.user_id == user.user_id))
+    if cursor:
+        q = q.filter(before(Conversation.updated_at, Conversation.id, cursor))
+    rows = _fetch_page(q.order_by(Conversation.updated_at.desc(), Conversation.id.desc()), limit)
+    rows = _set_next_cursor(response, rows, limit, "updated_at")
     return [ConversationSummary(id=r.id, title=r.title, created_at=r.created_at, updated_at=r.updated_at) for r in rows]
 
+def _get_owned(db: Session, user_id: str, conversation_id: str) -> Conversation:
+    conv = (db.query(Conversation)
+            .filter(Conversation.id == conversation_id, Conversation.user_id == user_id)
+            .first())
+    if not conv:
+        raise HTTPException(404, detail={"message": "Conversation not found."})
+    return conv
+
+def _message_page(db: Session, response: Response, conversation_id: str, limit: Optional[int],
+                  cursor: Optional[str], include_sources: bool) -> List[MessageDTO]:
+    """
+    Newest `limit` messages (all of them for None) older than `cursor`,
+    returned oldest first; the cursor for the page before them goes to
+    `X-Next-Cursor`. `sources` JSON is only read when asked for.
+    """
+    cols = [Message.id, Message.role, Message.content, Message.created_at]
+    if include_sources:
+        cols.append(Message.sources)
+    q = db.query(*cols).filter(Message.conversation_id == conversation_id)
+    if cursor:
+        q = q.filter(before(Message.created_at, Message.id, cursor))
+    rows = _fetch_page(q.order_by(Message.created_at.desc(), Message.id.desc()), limit)
+    rows = _set_next_cursor(response, rows, limit, "created_at")
+    return [MessageDTO(id=m.id, role=m.role, content=m.content, created_at=m.created_at,
+                       sources=m.sources if include_sources else None)
+            for m in reversed(rows)]
+
 @router.get("/conversations/{conversation_id}", response_model=ConversationDetail)
 def get_conversation(conversation_id: str,
+                     response: Response,
+                     limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+                     include_sources: bool = True,
                      user_id: Optional[str] = Header(default=None, alias="user-id"),
                      db: Session = Depends(get_db)):
+    """
+    The conversation with all its messages, or only the latest `limit` when
+    given; older ones then via `/messages` and `X-Next-Cursor`.
+    """
     user = require_user(user_id, db)
-    conv = (db.query(Conversation)
-            .filter(Conversation.id == conversation_id, Conversation.user_id == user.user_id)
-            .first())
-    if not conv:
-        raise HTTPException(404, detail={"message": "Conversation not found."})
-    msgs = [MessageDTO(id=m.id, role=m.role, content=m.content, created_at=m.created_at, sources=m.sources)
-            for m in conv.messages]
+    conv = _get_owned(db, user.user_id, conversation_id)
+    msgs = _message_page(db, response, conv.id, limit, None, include_sources)
     return ConversationDetail(id=conv.id, title=conv.title, created_at=conv.created_at,
                               updated_at=conv.updated_at, messages=msgs)
 
+@router.get("/conversations/{conversation_id}/messages", response_model=List[MessageDTO])
+def list_messages(conversation_id: str,
+                  response: Response,
+                  limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=PAGE_SIZE_MAX),
+                  cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page."),
+                  include_sources: bool = False,
+                  user_id: Optional[str] = Header(default=None, alias="user-id"),
+                  db: Session = Depends(get_db)):
+    """Pages backwards from the newest message; each page is in chronological order."""
+    user = require_user(user_id, db)
+    conv = _get_owned(db, user.user_id, conversation_id)
+    return _message_page(db, response, conv.id, limit, cursor, include_sources)
+
 @router.delete("/conversations/{conversation_id}")
 def delete_conversation(conversation_id: str,
                         user_id: Optional[str] = Header(default=None, alias="user-id"),
                         db: Session = Depends(get_db)):
     user = require_user(user_id, db)
-    conv = (db.query(Conversation)
-            .filter(Conversation.id == conversation_id, Conversation.user_id == user.user_id)
-            .first())
-    if not conv:
-        raise HTTPException(404, detail={"message": "Conversation not found."})
+    conv = _get_owned(db, user.user_id, conversation_id)
     db.delete(conv); db.commit()
     return {"status": "deleted"}
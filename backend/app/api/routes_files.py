@@ -1,14 +1,29 @@
-import os, tempfile, uuid
-from fastapi import APIRouter, UploadFile, File, Depends, Header, HTTPException
+import os, uuid
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
-from ..db import get_db
-from ..models import FileRecord, User
-from ..api.deps import require_user
-from ..services.parsers import extract_text_blobs
-from ..services.chunking import chunk_text
-from ..services.embeddings import embed
-from ..services.vectorstore import collection, count_where, force_delete_doc_chunks
+from ..db import get_db, get_async_db
+from ..models import FileRecord, IngestJob, User
+from ..schemas.files import IngestJobStatus
+from ..api.deps import require_user, require_user_async
+from ..services.vectorstore import get_store
+from ..services.executor import run_io, ingest_pool
+from ..services.ingestion import (
+    index_document,
+    create_job,
+    submit_ingest_job,
+    fail_job,
+    find_indexed_duplicate,
+    clone_document_chunks,
+    drop_doc_chunks,
+    drop_user_chunks,
+)
+from ..config import DEDUPE_ENABLED
+from ..services.uploads import spool_upload, discard_spool
+from ..services.retrieval import invalidate_docs, invalidate_user
+from ..services.identity import forget_user, invalidate_user_docs
+from ..utils.timing import span, current_timings
 
 
 router = APIRouter(prefix="/v1", tags=["files"])
@@ -36,6 +51,7 @@ def list_files(
                     "content_type": f.content_type,
                     "page_count": f.page_count,
                     "created_at": f.created_at.isoformat(),
+                    "status": f.status or "ready",
                 }
                 for f in rows
             ]
@@ -43,7 +59,7 @@ def list_files(
     # legacy fallback via Chroma metadatas
     # ---- Legacy fallback via Chroma metadata (robust to all shapes) ----
     try:
-        res = collection.get(where={"user_id": user_id}, include=["metadatas"])
+        res = get_store().get(user_id, include=["metadatas"])
     except Exception:
         return {"files": []}
 
@@ -73,77 +89,186 @@ def list_files(
     return {"files": [{"id": k, "name": v} for k, v in files_map.items()]}
 
 
-@router.post("/files")
+async def _save_record(db: AsyncSession, rec: FileRecord) -> None:
+    db.add(rec)
+    await db.commit()
+
+
+async def _save_record_and_job(db: AsyncSession, rec: FileRecord, filename: str) -> str:
+    db.add(rec)
+    await db.commit()
+    return (await create_job(db, rec.user_id, rec.doc_id, filename)).id
+
+
+async def _try_dedupe(db: AsyncSession, rec: FileRecord, content_hash: str) -> Optional[int]:
+    """
+    Reuse the chunks and vectors of an already-indexed identical upload.
+    Returns the number of cloned chunks, or None to fall back to full indexing.
+    """
+    src = await find_indexed_duplicate(db, content_hash, rec.user_id)
+    if src is None:
+        return None
+    src_user_id, src_doc_id = src.user_id, src.doc_id
+    same_user = src_user_id == rec.user_id
+    page_count, src_meta = src.page_count, dict(src.extra_metadata or {})
+
+    cloned = await ingest_pool.run(
+        clone_document_chunks, src_user_id, src_doc_id, rec.user_id, rec.doc_id, rec.filename
+    )
+    if not cloned:
+        # Source vanished mid-clone (or had no text): index from scratch
+        return None
+
+    rec.page_count = page_count
+    if same_user:
+        rec.extra_metadata = {**src_meta, "deduplicated_from": src_doc_id}
+    else:
+        rec.extra_metadata = {"source": os.path.basename(rec.filename), "page_count": page_count}
+    await _save_record(db, rec)
+    invalidate_docs(rec.user_id, [rec.doc_id])
+    invalidate_user_docs(rec.user_id)
+    return cloned
+
+
+# The body is parsed by spool_upload, not by FastAPI, so describe it for the docs
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/files", openapi_extra=_UPLOAD_BODY)
 async def upload_file(
-    file: UploadFile = File(...),
+    request: Request,
+    response: Response,
+    background: bool = Query(
+        False, description="Return 202 with a job id and index in the background."
+    ),
+    debug: bool = Query(False, description="Include per-stage timings (ms) under `debug`."),
     user_id: Optional[str] = Header(default=None, alias="user-id"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user: User = require_user(user_id, db)
-    suffix = os.path.splitext(file.filename)[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        raw = await file.read()
-        tmp.write(raw)
-        tmp_path = tmp.name
-    try:
-        blobs, meta = extract_text_blobs(tmp_path, file.filename)
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
-
-    if not blobs:
-        doc_id = str(uuid.uuid4())
-        rec = FileRecord(
-            doc_id=doc_id,
-            user_id=user.user_id,
-            filename=file.filename,
-            content_type=file.content_type,
-            size_bytes=len(raw),
-            page_count=meta.get("page_count"),
-            extra_metadata=meta,
-        )
-        db.add(rec)
-        db.commit()
-        return {
-            "status": "no_text_found",
-            "chunks": 0,
-            "doc_id": doc_id,
-            "filename": file.filename,
-        }
+    def reply(payload: dict) -> dict:
+        if debug:
+            payload["debug"] = {"timings": current_timings()}
+        return payload
 
-    doc_id = str(uuid.uuid4())
-    chunk_texts, chunk_metas = [], []
-    for b in blobs:
-        for c in chunk_text(b["text"]):
-            chunk_texts.append(c)
-            m = {"user_id": user.user_id, "doc_id": doc_id, **(b.get("metadata") or {})}
-            chunk_metas.append(m)
-
-    vectors = embed(chunk_texts)
-    ids = [str(uuid.uuid4()) for _ in chunk_texts]
-    collection.add(
-        ids=ids, documents=chunk_texts, metadatas=chunk_metas, embeddings=vectors
-    )
+    with span("db"):
+        user: User = await require_user_async(user_id, db)
+    owner_id = user.user_id
+    with span("spool"):
+        spooled = await spool_upload(request)
+    tmp_path = spooled.path
+    filename = spooled.filename
 
+    doc_id = str(uuid.uuid4())
     rec = FileRecord(
         doc_id=doc_id,
-        user_id=user.user_id,
-        filename=file.filename,
-        content_type=file.content_type,
-        size_bytes=len(raw),
-        page_count=meta.get("page_count"),
-        extra_metadata=meta,
+        user_id=owner_id,
+        filename=filename,
+        content_type=spooled.content_type,
+        size_bytes=spooled.size_bytes,
+        content_hash=spooled.sha256,
     )
-    db.add(rec)
-    db.commit()
-    return {
-        "status": "indexed",
-        "chunks": len(ids),
+
+    if DEDUPE_ENABLED:
+        with span("dedupe"):
+            deduped = await _try_dedupe(db, rec, spooled.sha256)
+        if deduped is not None:
+            discard_spool(tmp_path)
+            return reply({
+                "status": "deduplicated",
+                "chunks": deduped,
+                "doc_id": doc_id,
+                "filename": filename,
+            })
+
+    if background:
+        # The record is visible right away but refused by /v1/chat until ready
+        rec.status = "indexing"
+        with span("db"):
+            job_id = await _save_record_and_job(db, rec, filename)
+        invalidate_user_docs(owner_id)
+        try:
+            submit_ingest_job(job_id, tmp_path, filename, owner_id, doc_id)
+        except HTTPException:
+            await run_io(fail_job, job_id, doc_id, "Ingestion queue is full.")
+            discard_spool(tmp_path)
+            raise
+        response.status_code = 202
+        return reply({
+            "status": "queued",
+            "job_id": job_id,
+            "doc_id": doc_id,
+            "filename": filename,
+        })
+
+    try:
+        pending = ingest_pool.submit(
+            index_document, tmp_path, filename, owner_id, doc_id
+        )
+    except HTTPException:
+        discard_spool(tmp_path)
+        raise
+    # index_document removes the spool file itself once it runs
+    with span("index"):
+        chunks, meta = await pending
+    rec.page_count = meta.get("page_count")
+    rec.extra_metadata = meta
+    with span("db"):
+        await _save_record(db, rec)
+    invalidate_docs(owner_id, [doc_id])
+    invalidate_user_docs(owner_id)
+    return reply({
+        "status": "indexed" if chunks else "no_text_found",
+        "chunks": chunks,
         "doc_id": doc_id,
-        "filename": file.filename,
-    }
+        "filename": filename,
+    })
+
+
+def _get_job(db: Session, user_id: Optional[str], job_id: str) -> IngestJob:
+    user: User = require_user(user_id, db)
+    job = (
+        db.query(IngestJob)
+        .filter(IngestJob.id == job_id, IngestJob.user_id == user.user_id)
+        .first()
+    )
+    if not job:
+        raise HTTPException(404, detail={"message": "Job not found."})
+    return job
+
+
+@router.get("/files/jobs/{job_id}", response_model=IngestJobStatus)
+def get_ingest_job(
+    job_id: str,
+    user_id: Optional[str] = Header(default=None, alias="user-id"),
+    db: Session = Depends(get_db),
+):
+    job = _get_job(db, user_id, job_id)
+    return IngestJobStatus(
+        job_id=job.id,
+        doc_id=job.doc_id,
+        filename=job.filename,
+        status=job.status,
+        pages_total=job.pages_total,
+        pages_parsed=job.pages_parsed or 0,
+        chunks_total=job.chunks_total or 0,
+        chunks_embedded=job.chunks_embedded or 0,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
 
 
 @router.delete("/files/{doc_id}")
@@ -160,14 +285,18 @@ def delete_file(
     )
     if not rec:
         # Idempotent delete: ensure vectors are gone even if DB row already missing
-        _ = force_delete_doc_chunks(user.user_id, doc_id)
+        _ = drop_doc_chunks(user.user_id, doc_id)
+        invalidate_docs(user.user_id, [doc_id])
+        invalidate_user_docs(user.user_id)
         return {"status": "deleted", "approx_chunks_deleted": 0}
 
-    remaining_before = count_where({"user_id": user.user_id, "doc_id": doc_id}) or 0
-    remaining_after = force_delete_doc_chunks(user.user_id, doc_id)
+    remaining_before = get_store().count(user.user_id, doc_id) or 0
+    remaining_after = drop_doc_chunks(user.user_id, doc_id)
+    invalidate_docs(user.user_id, [doc_id])
 
     db.delete(rec)
     db.commit()
+    invalidate_user_docs(user.user_id)
 
     approx_deleted = max(0, remaining_before - remaining_after)
     return {"status": "deleted", "approx_chunks_deleted": approx_deleted}
@@ -179,12 +308,11 @@ def reset_user(
     db: Session = Depends(get_db),
 ):
     user: User = require_user(user_id, db)
-    where = {"user_id": user.user_id}
-    count_before = count_where(where)
-    try:
-        collection.delete(where=where)
-    except Exception:
-        pass
+    count_before = get_store().count(user.user_id)
+    drop_user_chunks(user.user_id)
     db.query(FileRecord).filter(FileRecord.user_id == user.user_id).delete()
     db.commit()
+    invalidate_user(user.user_id)
+    # Drop the cached user along with their documents; the next request re-reads both
+    forget_user(user.user_id)
     return {"status": "reset", "approx_chunks_deleted": count_before}
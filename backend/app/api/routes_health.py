@@ -1,5 +1,18 @@
 from fastapi import APIRouter
-from ..config import EMBED_MODEL, LLM_PROVIDER, LLM_MODEL, OCR_ENABLED, DB_URL, CHROMA_DIR
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ..config import (
+    EMBED_MODEL, LLM_PROVIDER, LLM_MODEL, OCR_ENABLED, DB_URL, CHROMA_DIR, METRICS_ENABLED,
+)
+from ..services.executor import executor_stats
+from ..services.embeddings import embedding_cache_stats, embedding_batcher_stats
+from ..services.retrieval import query_cache_stats
+from ..services.lexical import lexical_stats
+from ..services.exact_index import exact_stats
+from ..services.rerank import rerank_stats
+from ..services.identity import identity_stats
+from ..utils.profiling import profiler_stats
+from ..services.warmup import readiness
+from ..services.metrics import render_metrics
 
 router = APIRouter()
 
@@ -14,4 +27,28 @@ def health():
         "ocr_enabled": OCR_ENABLED,
         "db_url": DB_URL,
         "chroma_dir": CHROMA_DIR,
+        "executors": executor_stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "embedding_batcher": embedding_batcher_stats(),
+        "query_caches": query_cache_stats(),
+        "lexical_index": lexical_stats(),
+        "exact_index": exact_stats(),
+        "rerank": rerank_stats(),
+        "identity_cache": identity_stats(),
+        "profiler": profiler_stats(),
     }
+
+
+@router.get("/ready")
+def ready():
+    """503 until the embedding model and vector store are loaded (see WARMUP_ON_STARTUP)."""
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+if METRICS_ENABLED:
+
+    @router.get("/metrics", include_in_schema=False)
+    def metrics():
+        """Prometheus text exposition of this worker's counters and histograms."""
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -13,7 +13,146 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:1143
 DB_URL = os.getenv("DB_URL", "sqlite:///./data/app.db")
 if DB_URL.startswith("sqlite:///"):
     os.makedirs("./data", exist_ok=True)
+# Async driver URL for the async routes; derived from DB_URL when empty
+# (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg)
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL", "")
 
 OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() in ("1", "true", "yes")
 
 os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+# Upstream LLM HTTP clients (pooled, shared for the app lifetime)
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+LLM_OPENAI_CLIENT_CACHE = int(os.getenv("LLM_OPENAI_CLIENT_CACHE", "32"))
+
+# Execution pools for blocking work called from async routes
+EXEC_CPU_WORKERS = int(os.getenv("EXEC_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXEC_IO_WORKERS = int(os.getenv("EXEC_IO_WORKERS", "16"))
+EXEC_MAX_QUEUE = int(os.getenv("EXEC_MAX_QUEUE", "256"))  # 0 = unbounded
+
+# Document ingestion
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", "64"))  # 0 = unbounded
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+
+# Upload spooling
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))  # 0 = unlimited
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # default: system temp dir
+
+# Content-addressed dedupe of re-uploaded documents
+DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUPE_CROSS_USER = os.getenv("DEDUPE_CROSS_USER", "false").lower() in ("1", "true", "yes")
+
+# Persistent embedding cache keyed by (EMBED_MODEL, normalized text hash)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./data/embed_cache.db")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+
+# Query-side caches (in-process; 0 disables)
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL_S = float(os.getenv("RETRIEVAL_CACHE_TTL_S", "60"))
+
+# Dynamic micro-batching of concurrent embed() calls
+EMBED_BATCH_ENABLED = os.getenv("EMBED_BATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "64"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+# Load the embedding model and vector store in the background at startup
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Parallel page-level PDF text extraction (process pool)
+PDF_PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", str(min(4, os.cpu_count() or 1))))  # <=1 disables
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "128"))  # fewer pages stay serial
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# CSV ingestion: rows read per pandas batch (bounds memory on large exports)
+CSV_READ_ROWS = int(os.getenv("CSV_READ_ROWS", "5000"))
+
+# Lexical (SQLite FTS5) chunk index and retrieval mode
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH",
+    # Next to the app database when that is SQLite
+    os.path.join(os.path.dirname(DB_URL[len("sqlite:///"):]) or ".", "lexical.db")
+    if DB_URL.startswith("sqlite:///")
+    else "./data/lexical.db",
+)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()  # auto | vector | lexical | hybrid
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "3"))  # per-ranker candidates = top_k * this
+
+# Vector store sharding: "none" (one "docs" collection), "user" (collection per
+# user) or "bucket" (users hashed into VECTOR_SHARD_BUCKETS collections)
+VECTOR_SHARDING = os.getenv("VECTOR_SHARDING", "none").lower()
+VECTOR_SHARD_BUCKETS = int(os.getenv("VECTOR_SHARD_BUCKETS", "64"))
+
+# Exact (brute-force NumPy) search over per-document memory-mapped vectors,
+# used instead of Chroma when the selected documents are small enough
+EXACT_SEARCH_ENABLED = os.getenv("EXACT_SEARCH_ENABLED", "true").lower() in ("1", "true", "yes")
+EXACT_INDEX_DIR = os.getenv("EXACT_INDEX_DIR", "./data/exact_index")
+EXACT_SEARCH_MAX_CHUNKS = int(os.getenv("EXACT_SEARCH_MAX_CHUNKS", "20000"))
+EXACT_OPEN_DOCS = int(os.getenv("EXACT_OPEN_DOCS", "256"))  # documents kept open (LRU)
+
+# Compact vectors. EMBED_DIM > 0 keeps only the first EMBED_DIM dimensions
+# (re-normalized; for Matryoshka-trained models such as bge-m3) and requires
+# re-indexing. EXACT_INDEX_DTYPE is the exact engine's scan precision; with
+# EXACT_RESCORE the top EXACT_RESCORE_FACTOR * k candidates are re-ranked
+# against float32 copies kept on disk.
+EMBED_DIM = int(os.getenv("EMBED_DIM", "0"))
+EXACT_INDEX_DTYPE = os.getenv("EXACT_INDEX_DTYPE", "float32").lower()  # float32 | float16 | int8
+EXACT_RESCORE = os.getenv("EXACT_RESCORE", "true").lower() in ("1", "true", "yes")
+EXACT_RESCORE_FACTOR = int(os.getenv("EXACT_RESCORE_FACTOR", "4"))
+
+# Optional cross-encoder reranking of retrieved chunks (CPU). Candidates that
+# can't be scored within RERANK_BUDGET_MS keep their retrieval order.
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-base")
+RERANK_BATCH = int(os.getenv("RERANK_BATCH", "16"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "400"))
+RERANK_MAX_CHARS = int(os.getenv("RERANK_MAX_CHARS", "1500"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "8192"))
+RERANK_MAX_CONTEXT = int(os.getenv("RERANK_MAX_CONTEXT", "4"))  # chunks sent to the LLM after reranking
+
+# Conversation history in the RAG prompt: the last N messages verbatim (capped
+# per message and in total), older turns folded into a bounded rolling summary
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))  # upper bound for history_limit
+HISTORY_MESSAGE_MAX_CHARS = int(os.getenv("HISTORY_MESSAGE_MAX_CHARS", "1200"))
+HISTORY_MAX_CHARS = int(os.getenv("HISTORY_MAX_CHARS", "6000"))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "1500"))
+
+# Keyset pagination (conversations by updated_at, messages by created_at)
+CONVERSATIONS_PAGE_SIZE = int(os.getenv("CONVERSATIONS_PAGE_SIZE", "50"))
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+
+# SQLite tuning, applied to every new connection of the app database
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "yes")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()  # OFF | NORMAL | FULL | EXTRA
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes, 0 = off
+
+# Identity / ownership caches (per process). Only positive answers are cached
+# and the TTL bounds staleness across workers, which don't share invalidations
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_S = float(os.getenv("USER_CACHE_TTL_S", "30"))
+DOC_OWNERSHIP_CACHE_TTL_S = float(os.getenv("DOC_OWNERSHIP_CACHE_TTL_S", "30"))
+
+# Prometheus text-format metrics at GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Request timing: Server-Timing header on every response, and an opt-in
+# sampling profiler (pyinstrument) that keeps profiles of slow requests
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))  # share of requests profiled
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "1000"))  # only slower ones are written
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_PATH_PREFIX = os.getenv("PROFILE_PATH_PREFIX", "/v1/")
@@ -1,13 +1,63 @@
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from .config import DB_URL
-
-engine = create_engine(
+from .config import (
     DB_URL,
-    connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {},
-    future=True,
+    ASYNC_DB_URL,
+    SQLITE_WAL,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+)
+
+_IS_SQLITE = DB_URL.startswith("sqlite")
+
+# `timeout` is the sqlite3 busy handler: writers wait for the lock instead of
+# failing straight away with "database is locked"
+_CONNECT_ARGS = (
+    {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000} if _IS_SQLITE else {}
 )
+
+engine = create_engine(DB_URL, connect_args=_CONNECT_ARGS, future=True)
+
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition(":")
+    driver = scheme.split("+", 1)[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+# Same database for the async routes (chat, upload), so their queries and
+# commits don't hold a worker thread or block the event loop
+async_engine = create_async_engine(ASYNC_DB_URL or _async_url(DB_URL), connect_args=_CONNECT_ARGS)
+
+if _IS_SQLITE:
+
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            if SQLITE_WAL and engine.url.database not in (None, "", ":memory:"):
+                # Readers no longer block the writer (and vice versa)
+                cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cur.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+            cur.execute(f"PRAGMA cache_size={-int(SQLITE_CACHE_SIZE_KB)}")
+            cur.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+            cur.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cur.close()
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+# expire_on_commit=False: attributes stay readable after a commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -16,3 +66,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
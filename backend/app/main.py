@@ -3,7 +3,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from .db import Base, engine
-from .utils.sqlite_compat import _ensure_sqlite_columns
+from .migrations import run_migrations
+from .services.http_clients import init_clients, close_clients
+from .services.executor import shutdown_pools
+from .services.ingestion import fail_inflight_jobs
+from .utils.limits import MaxUploadSizeMiddleware
+from .services.warmup import start_warm_up
+from .services.parsers import shutdown_pdf_pool
+from .config import (
+    MAX_UPLOAD_BYTES, WARMUP_ON_STARTUP, METRICS_ENABLED, SERVER_TIMING_ENABLED,
+    PROFILE_ENABLED, PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_INTERVAL_MS,
+    PROFILE_PATH_PREFIX,
+)
+from .utils.metrics import RequestMetricsMiddleware
+from .services.metrics import HTTP_SECONDS
+from .utils.timing import TimingMiddleware
+from .utils.profiling import SamplingProfilerMiddleware
 from .utils.errors import (
     http_exception_handler,
     validation_exception_handler,
@@ -22,18 +37,44 @@ from .api.routes_admin import router as admin_router
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
-    _ensure_sqlite_columns(engine)
-    yield
+    run_migrations(engine)
+    init_clients()
+    if WARMUP_ON_STARTUP:
+        start_warm_up()
+    try:
+        yield
+    finally:
+        await close_clients()
+        fail_inflight_jobs()
+        shutdown_pools()
+        shutdown_pdf_pool()
 
 app = FastAPI(title="Documents Chat — RAG Backend", lifespan=lifespan)
 
-# CORS
+# Middleware added later wraps the earlier ones: CORS goes on top of the
+# upload limit so that browsers can read its 413
+app.add_middleware(MaxUploadSizeMiddleware, max_bytes=MAX_UPLOAD_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
+if METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware, seconds=HTTP_SECONDS)
+if PROFILE_ENABLED:
+    app.add_middleware(
+        SamplingProfilerMiddleware,
+        out_dir=PROFILE_DIR,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        slow_ms=PROFILE_SLOW_MS,
+        interval_ms=PROFILE_INTERVAL_MS,
+        path_prefix=PROFILE_PATH_PREFIX,
+    )
+# Added last so it wraps the others and its spans cover the whole request.
+# Always installed: `debug` timings need the spans even without the header
+app.add_middleware(TimingMiddleware, header=SERVER_TIMING_ENABLED)
 
 # Routers
 app.include_router(health_router)
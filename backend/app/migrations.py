@@ -0,0 +1,98 @@
+"""
+Versioned schema migrations.
+
+`Base.metadata.create_all` builds fresh databases from the models; the steps
+below bring older databases up to the same schema. Each step runs once, in
+its own transaction, and is recorded in `schema_migrations`. Steps are
+idempotent so that a fresh database (or a second worker racing the first)
+can apply them harmlessly.
+
+    python -m app.migrations    # apply pending steps and print the version
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from .models import Conversation, FileRecord, IngestJob, Message
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _add_column(conn: Connection, model, column: str, suffix: str = "") -> None:
+    table = model.__table__
+    if _has_column(conn, table.name, column):
+        return
+    ddl_type = table.c[column].type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column} {ddl_type}{suffix}")
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def _v1_added_columns(conn: Connection) -> None:
+    # Columns that used to be probed for on every startup
+    _add_column(conn, FileRecord, "extra_metadata")
+    _add_column(conn, FileRecord, "status", " NOT NULL DEFAULT 'ready'")
+    _add_column(conn, FileRecord, "content_hash")
+    _create_index(conn, "ix_files_content_hash", "files", "content_hash")
+    _add_column(conn, IngestJob, "pages_total")
+    _add_column(conn, Message, "sources")
+    _add_column(conn, Message, "meta")
+    _add_column(conn, Conversation, "summary")
+    _add_column(conn, Conversation, "summary_until")
+
+
+def _v2_composite_indexes(conn: Connection) -> None:
+    # Match the route queries: filter on the owner, sort on time, tie-break on id
+    _create_index(conn, "ix_messages_conv_created", "messages", "conversation_id, created_at, id")
+    _create_index(conn, "ix_conversations_user_updated", "conversations", "user_id, updated_at, id")
+    _create_index(conn, "ix_files_user_created", "files", "user_id, created_at")
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "added_columns", _v1_added_columns),
+    (2, "composite_indexes", _v2_composite_indexes),
+]
+
+
+def current_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return 0
+        return conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+
+
+def run_migrations(engine: Engine) -> int:
+    """Apply pending steps in order; returns the resulting schema version."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        )
+        applied = {v for (v,) in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, name, step in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow()},
+                )
+        except IntegrityError:
+            # Another worker recorded the same step first
+            pass
+    return current_version(engine)
+
+
+if __name__ == "__main__":
+    from .db import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    print(f"schema version {run_migrations(engine)}")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy import JSON as SA_JSON
 from .db import Base
@@ -13,6 +13,8 @@ class User(Base):
 
 class FileRecord(Base):
     __tablename__ = "files"
+    # GET /v1/files: a user's files, newest first
+    __table_args__ = (Index("ix_files_user_created", "user_id", "created_at"),)
     doc_id = Column(String, primary_key=True, index=True)
     user_id = Column(String, ForeignKey("users.user_id", ondelete="CASCADE"), index=True, nullable=False)
     filename = Column(String, nullable=False)
@@ -21,19 +23,28 @@ class FileRecord(Base):
     page_count = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     extra_metadata = Column(SA_JSON, nullable=True)
+    status = Column(String, nullable=False, default="ready")  # "indexing" | "ready" | "failed"
+    content_hash = Column(String, index=True, nullable=True)  # sha256 of the uploaded bytes
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    # Keyset pagination of a user's conversations, most recently updated first
+    __table_args__ = (Index("ix_conversations_user_updated", "user_id", "updated_at", "id"),)
     id = Column(String, primary_key=True, index=True)
     user_id = Column(String, ForeignKey("users.user_id", ondelete="CASCADE"), index=True, nullable=False)
     title = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    # Rolling summary of turns older than the prompt window, up to summary_until
+    summary = Column(Text, nullable=True)
+    summary_until = Column(DateTime, nullable=True)
     messages = relationship("Message", back_populates="conversation",
                             cascade="all, delete-orphan", order_by="Message.created_at")
 
 class Message(Base):
     __tablename__ = "messages"
+    # Serves "last N messages of a conversation" without touching the rest
+    __table_args__ = (Index("ix_messages_conv_created", "conversation_id", "created_at", "id"),)
     id = Column(String, primary_key=True, index=True)
     conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), index=True, nullable=False)
     user_id = Column(String, ForeignKey("users.user_id", ondelete="CASCADE"), index=True, nullable=False)
@@ -43,3 +54,18 @@ class Message(Base):
     sources = Column(SA_JSON, nullable=True)
     meta = Column(SA_JSON, nullable=True)
     conversation = relationship("Conversation", back_populates="messages")
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.user_id", ondelete="CASCADE"), index=True, nullable=False)
+    doc_id = Column(String, index=True, nullable=False)
+    filename = Column(String)
+    status = Column(String, nullable=False, default="queued")  # "queued" | "running" | "succeeded" | "failed"
+    pages_total = Column(Integer, nullable=True)
+    pages_parsed = Column(Integer, default=0)
+    chunks_total = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
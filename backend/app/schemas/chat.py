@@ -22,8 +22,17 @@ class ChatRequest(BaseModel):
     conversation_id: Optional[str] = None
     history_limit: int = 12
 
+    # retrieval: auto | vector | lexical | hybrid (default: RETRIEVAL_MODE)
+    retrieval_mode: Optional[str] = None
+    # cross-encoder reranking before the LLM (default: RERANK_ENABLED)
+    rerank: Optional[bool] = None
+
+    # include per-stage timings (ms) in the response's `debug` field
+    debug: bool = False
+
 
 class ChatResponse(BaseModel):
     response: str
     sources: List[Dict[str, Any]]
     conversation_id: str
+    debug: Optional[Dict[str, Any]] = None  # {"timings": {...}} when requested
@@ -1,4 +1,19 @@
+from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 class AdminResetBody(BaseModel):
     preserve_users: bool = True
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    doc_id: str
+    filename: Optional[str] = None
+    status: str  # "queued" | "running" | "succeeded" | "failed"
+    pages_total: Optional[int] = None
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -1,10 +1,20 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from functools import lru_cache
 
-def chunk_text(text: str):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=900,
-        chunk_overlap=150,
+CHUNK_SIZE = 900
+CHUNK_OVERLAP = 150
+
+
+@lru_cache(maxsize=1)
+def _splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
         length_function=len,
         separators=["\n\n", "\n", " ", ""],
     )
-    return splitter.split_text(text)
+
+
+def chunk_text(text: str):
+    return _splitter().split_text(text)
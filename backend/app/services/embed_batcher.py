@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Sequence, Tuple
+
+# Lower value = served first
+PRIORITY_QUERY = 0
+PRIORITY_BULK = 1
+_PRIORITIES = {"query": PRIORITY_QUERY, "bulk": PRIORITY_BULK}
+
+
+class _Request:
+    __slots__ = ("texts", "results", "pending", "future")
+
+    def __init__(self, texts: Sequence[str]):
+        self.texts = list(texts)
+        self.results: List[Any] = [None] * len(self.texts)
+        self.pending = len(self.texts)
+        self.future: "Future[List[Any]]" = Future()
+
+
+# A slice [start, end) of one request's texts, queued as a unit
+_Slice = Tuple[_Request, int, int]
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching in front of a batch `encode_fn(texts) -> vectors`.
+
+    Concurrent callers are coalesced into one forward pass of up to `max_batch`
+    texts. The first queued text waits at most `max_wait_ms` for company.
+    Query slices always fill a batch before bulk (ingestion) slices, and big
+    requests are split so they can never block queries for more than one batch.
+    A single daemon thread owns the model, so inference is never run concurrently.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], Sequence[Any]],
+                 max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queues: Dict[int, Deque[_Slice]] = {p: deque() for p in _PRIORITIES.values()}
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._thread: "threading.Thread | None" = None
+        self._closed = False
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, texts: Sequence[str], priority: str = "query") -> "Future[List[Any]]":
+        req = _Request(texts)
+        if not req.texts:
+            req.future.set_result([])
+            return req.future
+        q = self._queues[_PRIORITIES.get(priority, PRIORITY_BULK)]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self._ensure_thread()
+            for start in range(0, len(req.texts), self.max_batch):
+                end = min(start + self.max_batch, len(req.texts))
+                q.append((req, start, end))
+                self._queued += end - start
+            self._cond.notify()
+        return req.future
+
+    def encode(self, texts: Sequence[str], priority: str = "query") -> List[Any]:
+        return self.submit(texts, priority).result()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> List[_Slice]:
+        """Called with the lock held once at least one slice is queued."""
+        deadline = time.monotonic() + self.max_wait
+        while self._queued < self.max_batch and not self._closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+
+        batch: List[_Slice] = []
+        size = 0
+        for p in sorted(self._queues):
+            q = self._queues[p]
+            while q and size < self.max_batch:
+                req, start, end = q[0]
+                take = min(end - start, self.max_batch - size)
+                if take < end - start:
+                    # Split the slice; the tail stays at the head of its queue
+                    q[0] = (req, start + take, end)
+                else:
+                    q.popleft()
+                batch.append((req, start, start + take))
+                size += take
+            if size >= self.max_batch:
+                break
+        self._queued -= size
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queued and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._queued:
+                    return
+                batch = self._take_batch()
+
+            texts = [t for req, s, e in batch for t in req.texts[s:e]]
+            try:
+                vectors = self.encode_fn(texts)
+            except BaseException as exc:
+                for req, _, _ in batch:
+                    if not req.future.done():
+                        req.future.set_exception(exc)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            i = 0
+            for req, s, e in batch:
+                req.results[s:e] = vectors[i : i + (e - s)]
+                i += e - s
+                req.pending -= e - s
+                if req.pending == 0 and not req.future.done():
+                    req.future.set_result(req.results)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued_texts": self._queued,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else None,
+        }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
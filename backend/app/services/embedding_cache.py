@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+# SQLite's default limit on host parameters per statement is 999
+_LOOKUP_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    On-disk (SQLite) cache of embedding vectors keyed by sha256(model, normalized text).
+    Vectors are stored as raw float32 bytes. When the entry count exceeds
+    `max_entries`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, model: str, max_entries: int):
+        self.model = model
+        self.max_entries = max(0, max_entries)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS emb_cache ("
+                " key TEXT PRIMARY KEY, vec BLOB NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_emb_cache_last_used ON emb_cache (last_used)"
+            )
+            self._count = self._conn.execute("SELECT COUNT(*) FROM emb_cache").fetchone()[0]
+
+    def key(self, text: str) -> str:
+        h = hashlib.sha256()
+        h.update(self.model.encode("utf-8"))
+        h.update(b"\0")
+        h.update(normalize_text(text).encode("utf-8"))
+        return h.hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Bulk lookup; returns one vector (or None on miss) per input text."""
+        keys = [self.key(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        uniq = list(dict.fromkeys(keys))
+        now = int(time.time())
+        with self._lock:
+            for i in range(0, len(uniq), _LOOKUP_BATCH):
+                part = uniq[i : i + _LOOKUP_BATCH]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM emb_cache WHERE key IN ({marks})", part
+                ).fetchall()
+                for k, blob in rows:
+                    found[k] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    hit_keys = [k for k, _ in rows]
+                    self._conn.execute(
+                        f"UPDATE emb_cache SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [now, *hit_keys],
+                    )
+            out = [found.get(k) for k in keys]
+            n_hit = sum(1 for v in out if v is not None)
+            self.hits += n_hit
+            self.misses += len(out) - n_hit
+        return out
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        if not texts:
+            return
+        now = int(time.time())
+        rows = [
+            (self.key(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO emb_cache (key, vec, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+            self._count += self._conn.total_changes - before
+            if self.max_entries and self._count > self.max_entries:
+                self._evict(self._count - self.max_entries)
+
+    def _evict(self, n: int) -> None:
+        # Overshoot a little so we don't evict on every insert near the cap
+        n = n + max(1, self.max_entries // 100)
+        cur = self._conn.execute(
+            "DELETE FROM emb_cache WHERE key IN "
+            "(SELECT key FROM emb_cache ORDER BY last_used LIMIT ?)",
+            (n,),
+        )
+        self.evictions += cur.rowcount
+        self._count -= cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model,
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,142 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
-from ..config import EMBED_MODEL
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ..config import (
+    EMBED_MODEL,
+    EMBED_DIM,
+    EMBED_CACHE_ENABLED,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_MAX_ENTRIES,
+    EMBED_BATCH_ENABLED,
+    EMBED_BATCH_MAX,
+    EMBED_BATCH_WAIT_MS,
+)
+from .embedding_cache import EmbeddingCache
+from .embed_batcher import EmbeddingBatcher
+from .executor import run_cpu, run_io
+from .metrics import EMBED_SECONDS, EMBED_BATCH_SIZE, EMBED_CALL_SECONDS
 
-EMB = SentenceTransformer(EMBED_MODEL)
+# Loading the SentenceTransformer (and importing torch) takes seconds and a lot
+# of memory, so it happens on first use or during the optional startup warm-up.
+_model = None
+_model_lock = threading.Lock()
 
-def embed(texts: List[str]) -> List[List[float]]:
-    vecs = EMB.encode(texts, normalize_embeddings=True)
-    return [v.tolist() for v in vecs]
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+
+                _model = SentenceTransformer(EMBED_MODEL)
+    return _model
+
+
+def model_loaded() -> bool:
+    return _model is not None
+
+
+CACHE: Optional[EmbeddingCache] = (
+    EmbeddingCache(EMBED_CACHE_PATH, EMBED_MODEL, EMBED_CACHE_MAX_ENTRIES)
+    if EMBED_CACHE_ENABLED
+    else None
+)
+
+
+def _encode_direct(texts: List[str]):
+    model = get_model()
+    EMBED_BATCH_SIZE.observe(len(texts))
+    with EMBED_SECONDS.time():
+        return model.encode(texts, normalize_embeddings=True)
+
+
+BATCHER: Optional[EmbeddingBatcher] = (
+    EmbeddingBatcher(_encode_direct, EMBED_BATCH_MAX, EMBED_BATCH_WAIT_MS)
+    if EMBED_BATCH_ENABLED
+    else None
+)
+
+
+def _encode(texts: List[str], priority: str):
+    if BATCHER is None:
+        return _encode_direct(texts)
+    return BATCHER.encode(texts, priority)
+
+
+def _as_matrix(vecs) -> np.ndarray:
+    """Stack to a float32 (n, dim) array, truncated to EMBED_DIM and re-normalized if set."""
+    mat = np.asarray(vecs, dtype=np.float32)
+    if EMBED_DIM and mat.shape[1] > EMBED_DIM:
+        mat = mat[:, :EMBED_DIM]
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        mat = mat / np.where(norms == 0, 1.0, norms)
+    return mat
+
+
+def embed(texts: List[str], priority: str = "query") -> np.ndarray:
+    """
+    Normalized embeddings for `texts` as one float32 (n, dim) array. `priority`
+    is "query" for interactive traffic or "bulk" for ingestion; queries are
+    batched ahead of bulk work. The cache always holds full-size vectors, so
+    changing EMBED_DIM does not invalidate it.
+    """
+    if not texts:
+        return np.zeros((0, EMBED_DIM), dtype=np.float32)
+    with EMBED_CALL_SECONDS.time(priority=priority):
+        return _embed(texts, priority)
+
+
+def _embed(texts: List[str], priority: str) -> np.ndarray:
+    if CACHE is None:
+        return _as_matrix(_encode(texts, priority))
+
+    # Bulk lookup first, then encode each distinct miss exactly once
+    vecs = CACHE.get_many(texts)
+    misses = _misses(texts, vecs)
+    if misses:
+        encoded = _encode(misses, priority)
+        CACHE.put_many(misses, encoded)
+        vecs = _fill(texts, vecs, misses, encoded)
+    return _as_matrix(vecs)
+
+
+def _misses(texts: List[str], vecs) -> List[str]:
+    return list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+
+
+def _fill(texts: List[str], vecs, misses: List[str], encoded) -> list:
+    by_text = dict(zip(misses, encoded))
+    return [v if v is not None else by_text[t] for t, v in zip(texts, vecs)]
+
+
+async def embed_async(texts: List[str], priority: str = "query") -> np.ndarray:
+    """
+    embed() for the event loop. With the batcher on, the caller awaits the
+    batch future instead of parking a CPU-pool thread on it, so concurrent
+    queries coalesce up to EMBED_BATCH_MAX and the pool stays free for
+    rerank and exact search. Cache reads and writes run on the I/O pool.
+    """
+    if BATCHER is None:
+        return await run_cpu(embed, texts, priority)
+    if not texts:
+        return np.zeros((0, EMBED_DIM), dtype=np.float32)
+    with EMBED_CALL_SECONDS.time(priority=priority):
+        if CACHE is None:
+            return _as_matrix(await asyncio.wrap_future(BATCHER.submit(texts, priority)))
+        vecs = await run_io(CACHE.get_many, texts)
+        misses = _misses(texts, vecs)
+        if misses:
+            encoded = await asyncio.wrap_future(BATCHER.submit(misses, priority))
+            await run_io(CACHE.put_many, misses, encoded)
+            vecs = _fill(texts, vecs, misses, encoded)
+        return _as_matrix(vecs)
+
+
+def embedding_cache_stats() -> Optional[Dict[str, Any]]:
+    return CACHE.stats() if CACHE is not None else None
+
+
+def embedding_batcher_stats() -> Optional[Dict[str, Any]]:
+    return BATCHER.stats() if BATCHER is not None else None
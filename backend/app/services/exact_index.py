@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from ..config import (
+    EXACT_SEARCH_ENABLED,
+    EXACT_INDEX_DIR,
+    EXACT_SEARCH_MAX_CHUNKS,
+    EXACT_OPEN_DOCS,
+    EXACT_INDEX_DTYPE,
+    EXACT_RESCORE,
+    EXACT_RESCORE_FACTOR,
+)
+from ..utils.cache import LRUCache
+
+Ranked = List[Tuple[str, Any, Dict[str, Any]]]  # (chunk_id, document, metadata) in rank order
+
+# Scan matrix file per dtype. float32 rows (".f32") double as the rescoring copy.
+_SCAN_FILES = {"float32": (".f32", np.float32), "float16": (".f16", np.float16), "int8": (".i8", np.int8)}
+_SCORE_BLOCK = 2048  # rows upcast to float32 per step when scanning quantized matrices
+_ALL_FILES = (".json", ".f32", ".f16", ".i8", ".scale", ".jsonl", ".json.tmp")
+
+
+class _Doc(NamedTuple):
+    matrix: np.ndarray  # (count, dim) scan matrix, memory-mapped; rows L2-normalized before quantization
+    scales: Optional[np.ndarray]  # int8 only: per-row dequantization scale
+    full: Optional[np.ndarray]  # float32 rows for rescoring, memory-mapped (None if not kept)
+    ids: List[str]
+    texts: List[str]
+    metas: List[Dict[str, Any]]
+
+    def scores(self, q: np.ndarray) -> np.ndarray:
+        if self.matrix.dtype == np.float32:
+            return self.matrix @ q
+        # NumPy has no BLAS kernels for float16/int8: upcast a block at a time
+        out = np.empty(len(self.matrix), dtype=np.float32)
+        for i in range(0, len(self.matrix), _SCORE_BLOCK):
+            out[i : i + _SCORE_BLOCK] = self.matrix[i : i + _SCORE_BLOCK].astype(np.float32) @ q
+        return out * self.scales if self.scales is not None else out
+
+
+def _key(value: str) -> str:
+    # Ids come from clients; never use them as path components directly
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+
+
+def quantize_int8(mat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8: row ≈ q * scale, with scale = max|row| / 127."""
+    scale = np.abs(mat).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(mat / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+class ExactIndex:
+    """
+    Per-document embedding matrices on disk for exact (brute-force) search.
+
+    Each document lives under `<root>/<user key>/<doc key>` as a scan matrix
+    (`.f32`, `.f16`, or `.i8` plus per-row `.scale`) appended batch by batch
+    while indexing, a `.jsonl` with id, text and metadata per row, and a
+    `.json` manifest (`count`, `dim`, `dtype`, `rescore`) written last, so
+    only fully indexed documents are served. Quantized documents can keep a
+    float32 copy on disk; only the few candidate rows touched by rescoring are
+    paged in. For a few thousand chunks a dot product over the memory-mapped
+    rows is both faster and more accurate than a filtered ANN query.
+    """
+
+    def __init__(self, root: str, max_chunks: int, open_docs: int, dtype: str = "float32",
+                 rescore: bool = True, rescore_factor: int = 4):
+        if dtype not in _SCAN_FILES:
+            raise ValueError(f"EXACT_INDEX_DTYPE must be one of {tuple(_SCAN_FILES)}, got {dtype!r}")
+        self.root = root
+        self.max_chunks = max_chunks
+        self.dtype = dtype
+        # float32 scans are already exact
+        self.rescore = rescore and dtype != "float32"
+        self.rescore_factor = max(1, rescore_factor)
+        self._docs = LRUCache(open_docs)
+        self._counts = LRUCache(max(open_docs, 4096))
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.declined = 0
+
+    def _base(self, user_id: str, doc_id: str) -> str:
+        return os.path.join(self.root, _key(user_id), _key(doc_id))
+
+    # ---- writes (ingestion worker) ----
+
+    def append(self, user_id: str, doc_id: str, ids: Sequence[str], texts: Sequence[str],
+               metas: Sequence[Dict[str, Any]], vectors) -> None:
+        mat = np.asarray(vectors, dtype=np.float32)
+        if mat.ndim != 2 or not len(mat):
+            return
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        mat = mat / np.where(norms == 0, 1.0, norms)
+        base = self._base(user_id, doc_id)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+
+        if self.dtype == "float32" or self.rescore:
+            with open(base + ".f32", "ab") as f:
+                f.write(np.ascontiguousarray(mat).tobytes())
+        if self.dtype == "float16":
+            with open(base + ".f16", "ab") as f:
+                f.write(mat.astype(np.float16).tobytes())
+        elif self.dtype == "int8":
+            q, scale = quantize_int8(mat)
+            with open(base + ".i8", "ab") as f:
+                f.write(q.tobytes())
+            with open(base + ".scale", "ab") as f:
+                f.write(scale.tobytes())
+        with open(base + ".jsonl", "a", encoding="utf-8") as f:
+            for i, t, m in zip(ids, texts, metas):
+                f.write(json.dumps({"id": i, "text": t, "meta": m}, ensure_ascii=False) + "\n")
+
+    def finalize(self, user_id: str, doc_id: str) -> None:
+        base = self._base(user_id, doc_id)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        with open(base + ".jsonl", "a", encoding="utf-8"):
+            pass
+        with open(base + ".jsonl", encoding="utf-8") as f:
+            count = sum(1 for _ in f)
+        ext, dt = _SCAN_FILES[self.dtype]
+        size = os.path.getsize(base + ext) if os.path.exists(base + ext) else 0
+        dim = size // np.dtype(dt).itemsize // count if count else 0
+        manifest = {"count": count, "dim": dim, "dtype": self.dtype, "rescore": self.rescore}
+        tmp = base + ".json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, base + ".json")
+        self._forget(user_id, doc_id)
+
+    def delete_doc(self, user_id: str, doc_id: str) -> None:
+        base = self._base(user_id, doc_id)
+        self._forget(user_id, doc_id)
+        for ext in _ALL_FILES:
+            try:
+                os.remove(base + ext)
+            except FileNotFoundError:
+                pass
+
+    def delete_user(self, user_id: str) -> None:
+        self.clear_caches()
+        shutil.rmtree(os.path.join(self.root, _key(user_id)), ignore_errors=True)
+
+    def clear(self) -> None:
+        self.clear_caches()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def clear_caches(self) -> None:
+        self._docs.clear()
+        self._counts.clear()
+
+    def _forget(self, user_id: str, doc_id: str) -> None:
+        self._docs.pop((user_id, doc_id))
+        self._counts.pop((user_id, doc_id))
+
+    # ---- reads ----
+
+    def chunk_count(self, user_id: str, doc_id: str) -> Optional[int]:
+        """Rows of a fully indexed document, or None if it has no exact index."""
+        key = (user_id, doc_id)
+        count = self._counts.get(key)
+        if count is None:
+            try:
+                with open(self._base(user_id, doc_id) + ".json", encoding="utf-8") as f:
+                    count = int(json.load(f)["count"])
+            except (OSError, ValueError, KeyError):
+                return None
+            self._counts.put(key, count)
+        return count
+
+    def _open(self, user_id: str, doc_id: str) -> _Doc:
+        key = (user_id, doc_id)
+        doc = self._docs.get(key)
+        if doc is not None:
+            return doc
+        base = self._base(user_id, doc_id)
+        with open(base + ".json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        count, dim = int(manifest["count"]), int(manifest["dim"])
+        dtype = manifest.get("dtype", "float32")
+        ids, texts, metas = [], [], []
+        with open(base + ".jsonl", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                ids.append(row["id"])
+                texts.append(row["text"])
+                metas.append(row["meta"])
+
+        if len(ids) < count:
+            raise ValueError(f"{base}.jsonl is truncated")
+
+        ext, dt = _SCAN_FILES[dtype]
+        scales = full = None
+        if count:
+            matrix = np.memmap(base + ext, dtype=dt, mode="r", shape=(count, dim))
+            if dtype == "int8":
+                scales = np.fromfile(base + ".scale", dtype=np.float32, count=count)
+                if len(scales) != count:
+                    raise ValueError(f"{base}.scale is truncated")
+            if dtype != "float32" and manifest.get("rescore"):
+                full = np.memmap(base + ".f32", dtype=np.float32, mode="r", shape=(count, dim))
+        else:
+            matrix = np.zeros((0, dim), dtype=dt)
+        doc = _Doc(matrix, scales, full, ids[:count], texts[:count], metas[:count])
+        self._docs.put(key, doc)
+        return doc
+
+    def scope_size(self, user_id: str, doc_ids: Sequence[str]) -> Optional[int]:
+        """Total rows across `doc_ids`, or None if any of them has no exact index."""
+        total = 0
+        for d in dict.fromkeys(doc_ids):
+            n = self.chunk_count(user_id, d)
+            if n is None:
+                return None
+            total += n
+        return total
+
+    def search(self, user_id: str, doc_ids: Sequence[str], query_embedding, n: int) -> Optional[Ranked]:
+        """
+        Exact cosine top-n over the selected documents (approximate for
+        quantized documents without rescoring). Returns None (caller falls
+        back to Chroma) if a document has no exact index, its files are
+        missing or damaged, or the scope exceeds `max_chunks`.
+        """
+        doc_ids = list(dict.fromkeys(doc_ids))
+        total = self.scope_size(user_id, doc_ids)
+        if total is None or total > self.max_chunks:
+            with self._lock:
+                self.declined += 1
+            return None
+        docs: List[_Doc] = []
+        if total and n > 0:
+            for d in doc_ids:
+                try:
+                    docs.append(self._open(user_id, d))
+                except (OSError, ValueError, KeyError):
+                    # Partial write or manual cleanup: re-read the manifest next time
+                    self._forget(user_id, d)
+                    with self._lock:
+                        self.declined += 1
+                    return None
+        with self._lock:
+            self.searches += 1
+        if not total or n <= 0:
+            return []
+
+        q = np.asarray(query_embedding, dtype=np.float32).ravel()
+        q = q / (np.linalg.norm(q) or 1.0)
+        docs = [d for d in docs if len(d.ids)]
+        scores = np.concatenate([d.scores(q) for d in docs])
+        offsets = np.cumsum([0] + [len(d.ids) for d in docs])
+
+        rescore = any(d.full is not None for d in docs)
+        k = min(n * self.rescore_factor if rescore else n, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        which = np.searchsorted(offsets, top, side="right") - 1
+        if rescore:
+            for g, w in zip(top.tolist(), which.tolist()):
+                d = docs[w]
+                if d.full is not None:
+                    scores[g] = float(d.full[g - int(offsets[w])] @ q)
+        order = np.argsort(-scores[top], kind="stable")[:n]
+
+        out: Ranked = []
+        for g, w in zip(top[order].tolist(), which[order].tolist()):
+            d, row = docs[w], g - int(offsets[w])
+            out.append((d.ids[row], d.texts[row], d.metas[row]))
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dir": self.root,
+            "dtype": self.dtype,
+            "rescore": self.rescore,
+            "max_chunks": self.max_chunks,
+            "searches": self.searches,
+            "declined": self.declined,
+            "open_docs": self._docs.stats(),
+        }
+
+
+EXACT: Optional[ExactIndex] = (
+    ExactIndex(
+        EXACT_INDEX_DIR,
+        EXACT_SEARCH_MAX_CHUNKS,
+        EXACT_OPEN_DOCS,
+        EXACT_INDEX_DTYPE,
+        EXACT_RESCORE,
+        EXACT_RESCORE_FACTOR,
+    )
+    if EXACT_SEARCH_ENABLED
+    else None
+)
+
+
+def exact_append(user_id: str, doc_id: str, ids, texts, metas, vectors) -> None:
+    if EXACT is not None:
+        EXACT.append(user_id, doc_id, ids, texts, metas, vectors)
+
+
+def exact_finalize(user_id: str, doc_id: str) -> None:
+    if EXACT is not None:
+        EXACT.finalize(user_id, doc_id)
+
+
+def exact_delete_doc(user_id: str, doc_id: str) -> None:
+    if EXACT is not None:
+        EXACT.delete_doc(user_id, doc_id)
+
+
+def exact_delete_user(user_id: str) -> None:
+    if EXACT is not None:
+        EXACT.delete_user(user_id)
+
+
+def exact_clear() -> None:
+    if EXACT is not None:
+        EXACT.clear()
+
+
+def exact_search(user_id: str, doc_ids: Sequence[str], query_embedding, n: int) -> Optional[Ranked]:
+    return EXACT.search(user_id, doc_ids, query_embedding, n) if EXACT is not None else None
+
+
+def exact_stats() -> Optional[Dict[str, Any]]:
+    return EXACT.stats() if EXACT is not None else None
+
+
+def rebuild_from_store(batch: int = 500) -> int:
+    """Re-create every document's matrix from the vectors in Chroma."""
+    from .vectorstore import get_store
+
+    if EXACT is None:
+        return 0
+    EXACT.clear()
+    seen = set()
+    total = 0
+    for coll in get_store().all_collections():
+        offset = 0
+        while True:
+            r = coll.get(include=["documents", "metadatas", "embeddings"], limit=batch, offset=offset)
+            ids = r.get("ids") or []
+            if not ids:
+                break
+            offset += len(ids)
+            groups: Dict[Tuple[str, str], List[int]] = {}
+            for i, m in enumerate(r.get("metadatas") or []):
+                if m and m.get("user_id") and m.get("doc_id"):
+                    groups.setdefault((m["user_id"], m["doc_id"]), []).append(i)
+            docs, metas, embs = r.get("documents") or [], r.get("metadatas") or [], r.get("embeddings")
+            for (u, d), rows in groups.items():
+                EXACT.append(
+                    u, d, [ids[i] for i in rows], [docs[i] for i in rows],
+                    [metas[i] for i in rows], np.asarray([embs[i] for i in rows]),
+                )
+                seen.add((u, d))
+                total += len(rows)
+    for u, d in seen:
+        EXACT.finalize(u, d)
+    return total
+
+
+if __name__ == "__main__":
+    # python -m app.services.exact_index
+    print(f"wrote {rebuild_from_store()} vectors into {EXACT_INDEX_DIR}")
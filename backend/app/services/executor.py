@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+from fastapi import HTTPException
+from ..config import (
+    EXEC_CPU_WORKERS,
+    EXEC_IO_WORKERS,
+    EXEC_MAX_QUEUE,
+    INGEST_WORKERS,
+    INGEST_MAX_QUEUE,
+)
+
+T = TypeVar("T")
+
+
+class BoundedPool:
+    """
+    Thread pool with admission control and queue-depth accounting.
+
+    `queued` counts calls waiting for a worker, `active` those running. When
+    `max_queue` is reached new calls are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queued_seen = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use, and again after shutdown() (a second app
+        # startup in the same process, e.g. tests or reload)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"exec-{self.name}"
+                )
+            return self._executor
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self.max_queue and self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    503, {"message": f"Server busy ({self.name} pool saturated). Retry shortly."}
+                )
+            self.queued += 1
+            self.max_queued_seen = max(self.max_queued_seen, self.queued)
+
+    def _call(self, ctx: contextvars.Context, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return ctx.run(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "asyncio.Future[T]":
+        """Admit (or reject with 503) immediately; return an awaitable future."""
+        self._admit()
+        # Propagate contextvars (request-scoped state) into the worker thread
+        call = functools.partial(self._call, contextvars.copy_context(), fn, *args, **kwargs)
+        try:
+            fut = self._get_executor().submit(call)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            raise
+        fut.add_done_callback(self._on_done)
+        return asyncio.wrap_future(fut)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await self.submit(fn, *args, **kwargs)
+
+    def _on_done(self, fut) -> None:
+        # Cancelled before a worker picked it up: `_call` never ran
+        if fut.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "max_queued_seen": self.max_queued_seen,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# CPU-bound work: embedding inference, parsing, chunking
+cpu_pool = BoundedPool("cpu", EXEC_CPU_WORKERS, EXEC_MAX_QUEUE)
+# Blocking I/O: Chroma calls, sync SQLAlchemy sessions
+io_pool = BoundedPool("io", EXEC_IO_WORKERS, EXEC_MAX_QUEUE)
+# Whole-document ingestion pipelines (sync uploads and background jobs)
+ingest_pool = BoundedPool("ingest", INGEST_WORKERS, INGEST_MAX_QUEUE)
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await cpu_pool.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await io_pool.run(fn, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {p.name: p.stats() for p in (cpu_pool, io_pool, ingest_pool)}
+
+
+def shutdown_pools() -> None:
+    for p in (cpu_pool, io_pool, ingest_pool):
+        p.shutdown()
@@ -0,0 +1,113 @@
+import re
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import (
+    HISTORY_MAX_MESSAGES,
+    HISTORY_MESSAGE_MAX_CHARS,
+    HISTORY_MAX_CHARS,
+    HISTORY_SUMMARY_MAX_CHARS,
+)
+from ..models import Conversation, Message
+from .prompting import OOS_REPLY
+
+_CITATION = re.compile(r"\s*\[\d+\]")
+_SECTION = re.compile(r"^\s*(reasoning|sources)\s*:", re.IGNORECASE | re.MULTILINE)
+_ANSWER_LABEL = re.compile(r"^\s*answer\s*:\s*", re.IGNORECASE)
+_SUMMARY_LINE_CHARS = 240
+# Newest messages considered per fold; older lines would be trimmed anyway
+_FOLD_LIMIT = 200
+
+
+class History(NamedTuple):
+    turns: List[Dict[str, str]]  # {"role", "content"}, oldest first
+    summary: Optional[str]
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: max(0, limit - 1)].rstrip() + "…"
+
+
+def compact_message(role: str, content: str) -> str:
+    """
+    Prompt form of a stored message. Assistant answers keep only the Answer
+    section, without [n] citations: those indices pointed at an older CONTEXT.
+    """
+    text = content or ""
+    if role == "assistant":
+        m = _SECTION.search(text)
+        if m:
+            text = text[: m.start()]
+        text = _CITATION.sub("", _ANSWER_LABEL.sub("", text.strip()))
+    return text.strip()
+
+
+def _summary_line(role: str, content: str) -> str:
+    text = " ".join(compact_message(role, content).split())
+    if role == "user":
+        return "User asked: " + _clip(text, _SUMMARY_LINE_CHARS)
+    if text == OOS_REPLY:
+        return "Assistant had no information on that."
+    return "Assistant answered: " + _clip(text, _SUMMARY_LINE_CHARS)
+
+
+def fold_summary(summary: Optional[str], rows) -> str:
+    """Append (role, content) rows to a summary, dropping its oldest lines past the cap."""
+    lines = (summary or "").splitlines() + [_summary_line(r, c) for r, c in rows]
+    total = sum(len(ln) + 1 for ln in lines)
+    while lines and total > HISTORY_SUMMARY_MAX_CHARS:
+        total -= len(lines.pop(0)) + 1
+    return "\n".join(lines)
+
+
+async def load_history(db: AsyncSession, conv: Conversation, limit: int) -> History:
+    """
+    The last `limit` (capped at HISTORY_MAX_MESSAGES) user/assistant messages
+    of `conv`, minus the oldest of them past HISTORY_MAX_CHARS, plus a rolling
+    summary of everything before the kept turns. Only the window is read;
+    messages that slid out of it since the last turn are folded into
+    conv.summary, which is committed so the next turn starts from there.
+    """
+    limit = max(0, min(int(limit), HISTORY_MAX_MESSAGES))
+    if limit == 0:
+        return History([], None)
+    conv_id = conv.id
+    base = select(Message.role, Message.content, Message.created_at).where(
+        Message.conversation_id == conv_id,
+        Message.role.in_(("user", "assistant")),
+    )
+    order = (Message.created_at.desc(), Message.id.desc())
+    rows = (await db.execute(base.order_by(*order).limit(limit + 1))).all()
+    window = rows[:limit][::-1]
+    turns = [
+        {"role": r.role, "content": _clip(compact_message(r.role, r.content), HISTORY_MESSAGE_MAX_CHARS)}
+        for r in window
+    ]
+    # Total cap: the oldest turns go first, into the summary below
+    total = sum(len(t["content"]) for t in turns)
+    dropped = 0
+    while turns and total > HISTORY_MAX_CHARS:
+        total -= len(turns.pop(0)["content"])
+        dropped += 1
+
+    if len(rows) <= limit and not dropped:
+        return History(turns, None)
+
+    # Messages before the first kept turn exist: fold the ones not summarized yet
+    summary, summary_until = conv.summary, conv.summary_until
+    if dropped < len(window):
+        window_start = window[dropped].created_at
+        before_window = Message.created_at < window_start
+    else:
+        window_start = window[-1].created_at
+        before_window = Message.created_at <= window_start
+    if summary_until is None or summary_until < window_start:
+        q = base.where(before_window)
+        if summary_until is not None:
+            q = q.where(Message.created_at > summary_until)
+        pending = (await db.execute(q.order_by(*order).limit(_FOLD_LIMIT))).all()[::-1]
+        if pending:
+            summary = fold_summary(summary, [(r.role, r.content) for r in pending])
+            conv.summary, conv.summary_until = summary, pending[-1].created_at
+            await db.commit()
+    return History(turns, summary or None)
@@ -0,0 +1,101 @@
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+import httpx
+from ..config import (
+    LLM_HTTP_TIMEOUT,
+    LLM_HTTP_CONNECT_TIMEOUT,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_OPENAI_CLIENT_CACHE,
+)
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+OPENAI_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+class ClientRegistry:
+    """
+    Long-lived, pooled upstream clients.
+
+    One `httpx.AsyncClient` (connection pool) per base URL. `AsyncOpenAI` wrappers
+    are cached per (api key, base URL) and share the pool of their base URL, so
+    per-request keys from `X-OpenAI-Key` never open extra connections.
+    """
+
+    def __init__(
+        self,
+        timeout: float = LLM_HTTP_TIMEOUT,
+        connect_timeout: float = LLM_HTTP_CONNECT_TIMEOUT,
+        max_connections: int = LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = LLM_HTTP_KEEPALIVE_EXPIRY,
+        openai_cache_size: int = LLM_OPENAI_CLIENT_CACHE,
+    ):
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._openai_cache_size = max(1, openai_cache_size)
+        self._http: Dict[str, httpx.AsyncClient] = {}
+        self._openai: "OrderedDict[Tuple[str, str], AsyncOpenAI]" = OrderedDict()
+
+    def http(self, base_url: str) -> httpx.AsyncClient:
+        key = base_url.rstrip("/")
+        client = self._http.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+            self._http[key] = client
+        return client
+
+    def openai(self, api_key: str, base_url: Optional[str] = None) -> "AsyncOpenAI":
+        base = (base_url or OPENAI_DEFAULT_BASE_URL).rstrip("/")
+        # Never keep raw keys as dict keys
+        key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), base)
+        client = self._openai.get(key)
+        if client is not None:
+            self._openai.move_to_end(key)
+            return client
+        from openai import AsyncOpenAI  # imported on first OpenAI call; the SDK is slow to import
+
+        client = AsyncOpenAI(api_key=api_key, base_url=base, http_client=self.http(base))
+        self._openai[key] = client
+        # Evicted wrappers hold no sockets of their own; the shared pool stays open
+        while len(self._openai) > self._openai_cache_size:
+            self._openai.popitem(last=False)
+        return client
+
+    async def aclose(self) -> None:
+        self._openai.clear()
+        clients, self._http = list(self._http.values()), {}
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def init_clients() -> ClientRegistry:
+    global _registry
+    _registry = ClientRegistry()
+    return _registry
+
+
+def get_clients() -> ClientRegistry:
+    # Lazily created when used outside the app lifespan (scripts, tests)
+    return _registry or init_clients()
+
+
+async def close_clients() -> None:
+    global _registry
+    registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
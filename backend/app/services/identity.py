@@ -0,0 +1,62 @@
+from typing import Any, Dict, Iterable, Optional
+from ..config import IDENTITY_CACHE_SIZE, USER_CACHE_TTL_S, DOC_OWNERSHIP_CACHE_TTL_S
+from ..models import User
+from ..utils.cache import TTLCache
+
+# user_id -> username, for users known to exist
+USERS = TTLCache(IDENTITY_CACHE_SIZE, USER_CACHE_TTL_S)
+# user_id -> {doc_id: status} for all of the user's FileRecords
+DOC_STATUS = TTLCache(IDENTITY_CACHE_SIZE, DOC_OWNERSHIP_CACHE_TTL_S)
+
+
+def cached_user(user_id: Optional[str]) -> Optional[User]:
+    """
+    A detached, read-only User for a cached id, or None. Routes only read
+    `user_id` from it; it is never added to a session.
+    """
+    if not user_id:
+        return None
+    username = USERS.get(user_id)
+    if username is None:
+        return None
+    return User(user_id=user_id, username=username)
+
+
+def remember_user(user_id: str, username: str) -> None:
+    USERS.put(user_id, username)
+
+
+def ready_docs_cached(user_id: str, doc_ids: Iterable[str]) -> bool:
+    """
+    True if the cache says all `doc_ids` belong to the user and are ready.
+    Anything else (unknown, not ready, not cached) means "ask the DB": a
+    stale entry can cost a query but never rejects a valid request.
+    """
+    docs = DOC_STATUS.get(user_id)
+    return docs is not None and all(docs.get(d) == "ready" for d in doc_ids)
+
+
+def remember_docs(user_id: str, docs: Dict[str, str]) -> None:
+    DOC_STATUS.put(user_id, docs)
+
+
+def invalidate_user_docs(user_id: str) -> None:
+    DOC_STATUS.pop(user_id)
+
+
+def forget_user(user_id: str) -> None:
+    """Drop every cached entry of a user (their data was reset or removed)."""
+    USERS.pop(user_id)
+    DOC_STATUS.pop(user_id)
+
+
+def clear_identity() -> None:
+    USERS.clear()
+    DOC_STATUS.clear()
+
+
+def identity_stats() -> Dict[str, Any]:
+    return {
+        "users": {**USERS.stats(), "ttl_s": USERS.ttl},
+        "doc_ownership": {**DOC_STATUS.stats(), "ttl_s": DOC_STATUS.ttl},
+    }
@@ -0,0 +1,319 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import INGEST_EMBED_BATCH, DEDUPE_CROSS_USER
+from ..db import SessionLocal
+from ..models import FileRecord, IngestJob
+from .parsers import iter_text_blobs
+from .chunking import chunk_text
+from .embeddings import embed
+from .executor import ingest_pool
+from .vectorstore import get_store
+from .lexical import index_chunks, delete_doc_chunks, delete_user_chunks, clear_index
+from .exact_index import (
+    exact_append,
+    exact_finalize,
+    exact_delete_doc,
+    exact_delete_user,
+    exact_clear,
+)
+from .retrieval import invalidate_docs
+from .metrics import PARSE_SECONDS, CHUNK_SECONDS, INGEST_CHUNKS
+from ..utils.timing import add_span, span
+
+ProgressFn = Callable[..., None]
+T = TypeVar("T")
+
+
+def iter_chunks(
+    blobs: Iterable[Dict[str, Any]], user_id: str, doc_id: str
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream (chunk_text, chunk_metadata) pairs; one blob is split at a time.
+    Blobs flagged `prechunked` (packed CSV rows) are passed through unsplit.
+    """
+    for b in blobs:
+        base = {"user_id": user_id, "doc_id": doc_id, **(b.get("metadata") or {})}
+        if b.get("prechunked"):
+            yield b["text"], base
+            continue
+        for c in chunk_text(b["text"]):
+            yield c, dict(base)
+
+
+def _batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _timed(items: Iterable[T], spent: List[float]) -> Iterator[T]:
+    """Yield from `items`, adding the time spent producing them to spent[0]."""
+    it = iter(items)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        finally:
+            spent[0] += time.perf_counter() - t0
+        yield item
+
+
+def index_document(
+    tmp_path: str,
+    filename: str,
+    user_id: str,
+    doc_id: str,
+    progress: Optional[ProgressFn] = None,
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Streaming parse → chunk → embed → add to Chroma. Pages are pulled lazily,
+    and every INGEST_EMBED_BATCH chunks are embedded and written before more
+    pages are parsed, so peak memory is bounded by the batch size rather than
+    the document. Always removes `tmp_path`; on failure, chunks already written
+    are deleted again. Returns (chunk_count, file-level metadata).
+    `progress(**fields)` receives `pages_total`, `pages_parsed`, `chunks_total`
+    and `chunks_embedded` once per batch.
+    """
+    meta: Dict[str, Any] = {"source": os.path.basename(filename)}
+    pages = 0
+    written = 0
+    # Generator time: parsing alone, and parsing + chunking
+    parse_s, produce_s = [0.0], [0.0]
+
+    def counted(blobs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        nonlocal pages
+        for b in blobs:
+            if "page" in (b.get("metadata") or {}):
+                pages += 1
+            yield b
+
+    try:
+        blobs = counted(_timed(iter_text_blobs(tmp_path, filename, meta), parse_s))
+        chunks = _timed(iter_chunks(blobs, user_id, doc_id), produce_s)
+        for batch in _batched(chunks, INGEST_EMBED_BATCH):
+            texts = [t for t, _ in batch]
+            metas = [m for _, m in batch]
+            with span("embed"):
+                vectors = embed(texts, priority="bulk")
+            ids = [str(uuid.uuid4()) for _ in texts]
+            with span("chroma_add"):
+                get_store().add(user_id, ids, texts, metas, vectors)
+            with span("lexical_index"):
+                index_chunks(ids, texts, metas)
+            with span("exact_index"):
+                exact_append(user_id, doc_id, ids, texts, metas, vectors)
+            written += len(texts)
+            if progress:
+                progress(
+                    pages_total=meta.get("page_count"),
+                    pages_parsed=pages,
+                    chunks_total=written,
+                    chunks_embedded=written,
+                )
+    except BaseException:
+        if written:
+            drop_doc_chunks(user_id, doc_id)
+        raise
+    finally:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+
+    exact_finalize(user_id, doc_id)
+    file_type = os.path.splitext(filename)[1].lower().lstrip(".") or "none"
+    PARSE_SECONDS.observe(parse_s[0], file_type=file_type)
+    CHUNK_SECONDS.observe(max(0.0, produce_s[0] - parse_s[0]), file_type=file_type)
+    add_span("parse", parse_s[0])
+    add_span("chunk", max(0.0, produce_s[0] - parse_s[0]))
+    INGEST_CHUNKS.inc(written, file_type=file_type)
+    if progress:
+        progress(pages_total=meta.get("page_count"), pages_parsed=meta.get("page_count") or pages)
+    return written, meta
+
+
+def drop_doc_chunks(user_id: str, doc_id: str) -> int:
+    """Remove a document from every chunk index. Returns chunks still left in Chroma."""
+    remaining = get_store().delete_doc(user_id, doc_id)
+    delete_doc_chunks(user_id, doc_id)
+    exact_delete_doc(user_id, doc_id)
+    return remaining
+
+
+def drop_user_chunks(user_id: str) -> None:
+    get_store().delete_user(user_id)
+    delete_user_chunks(user_id)
+    exact_delete_user(user_id)
+
+
+def drop_all_chunks() -> None:
+    get_store().reset()
+    clear_index()
+    exact_clear()
+
+
+# ---- Content-addressed dedupe ----
+
+# Chunk metadata carried over when cloning; user_id/doc_id are always rewritten
+CLONEABLE_META_KEYS = ("source", "page", "row_start", "row_end")
+
+
+async def find_indexed_duplicate(
+    db: AsyncSession, content_hash: str, user_id: str
+) -> Optional[FileRecord]:
+    """A ready FileRecord with the same bytes: the user's own first, then (optionally) anyone's."""
+    q = (
+        select(FileRecord)
+        .where(FileRecord.content_hash == content_hash, FileRecord.status == "ready")
+        .order_by(FileRecord.created_at)
+        .limit(1)
+    )
+    own = (await db.execute(q.where(FileRecord.user_id == user_id))).scalar_one_or_none()
+    if own is not None or not DEDUPE_CROSS_USER:
+        return own
+    return (await db.execute(q)).scalar_one_or_none()
+
+
+def clone_document_chunks(
+    src_user_id: str, src_doc_id: str, user_id: str, doc_id: str, filename: str
+) -> int:
+    """
+    Copy an indexed document's chunks and vectors under a new (user_id, doc_id)
+    without parsing or embedding. Only `CLONEABLE_META_KEYS` are copied, and
+    for another user's document `source` is replaced by the new filename.
+    Returns the number of chunks written.
+    """
+    cross_user = src_user_id != user_id
+    written, offset = 0, 0
+    while True:
+        r = get_store().get(
+            src_user_id,
+            src_doc_id,
+            include=["documents", "metadatas", "embeddings"],
+            limit=INGEST_EMBED_BATCH,
+            offset=offset,
+        )
+        ids = r.get("ids") or []
+        if not ids:
+            break
+        offset += len(ids)
+        metas = []
+        for m in r.get("metadatas") or [{}] * len(ids):
+            m = {k: v for k, v in (m or {}).items() if k in CLONEABLE_META_KEYS}
+            if cross_user:
+                m["source"] = os.path.basename(filename)
+            metas.append({"user_id": user_id, "doc_id": doc_id, **m})
+        new_ids = [str(uuid.uuid4()) for _ in ids]
+        get_store().add(user_id, new_ids, r.get("documents") or [], metas, r.get("embeddings"))
+        index_chunks(new_ids, r.get("documents") or [], metas)
+        exact_append(user_id, doc_id, new_ids, r.get("documents") or [], metas, r.get("embeddings"))
+        written += len(ids)
+    exact_finalize(user_id, doc_id)
+    return written
+
+
+# ---- Background jobs ----
+
+async def create_job(db: AsyncSession, user_id: str, doc_id: str, filename: str) -> IngestJob:
+    job = IngestJob(id=str(uuid.uuid4()), user_id=user_id, doc_id=doc_id, filename=filename)
+    db.add(job)
+    await db.commit()
+    return job
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    with SessionLocal() as s:
+        job = s.get(IngestJob, job_id)
+        if job is None:
+            return
+        for k, v in fields.items():
+            setattr(job, k, v)
+        job.updated_at = datetime.utcnow()
+        s.commit()
+
+
+def fail_job(job_id: str, doc_id: str, error: str) -> None:
+    _finish(job_id, doc_id, error=error)
+
+
+def _finish(job_id: str, doc_id: str, *, error: Optional[str] = None,
+            chunks: int = 0, meta: Optional[Dict[str, Any]] = None) -> bool:
+    """Record the outcome. Returns False if the FileRecord was deleted meanwhile."""
+    with SessionLocal() as s:
+        job = s.get(IngestJob, job_id)
+        rec = s.get(FileRecord, doc_id)
+        if job is not None:
+            job.status = "failed" if error else "succeeded"
+            job.error = error
+            job.updated_at = datetime.utcnow()
+        if rec is not None:
+            rec.status = "failed" if error else "ready"
+            if meta is not None:
+                rec.page_count = meta.get("page_count")
+                rec.extra_metadata = {**meta, "chunks": chunks}
+        s.commit()
+        return rec is not None
+
+
+def run_ingest_job(job_id: str, tmp_path: str, filename: str, user_id: str, doc_id: str) -> None:
+    """Worker entry point: runs the pipeline and records progress and outcome on the job."""
+    _update_job(job_id, status="running")
+    try:
+        chunks, meta = index_document(
+            tmp_path, filename, user_id, doc_id,
+            progress=lambda **f: _update_job(job_id, **f),
+        )
+    except Exception as e:
+        if isinstance(e, HTTPException) and isinstance(e.detail, dict):
+            msg = e.detail.get("message") or str(e.detail)
+        else:
+            msg = f"{e.__class__.__name__}: {e}"
+        _finish(job_id, doc_id, error=msg)
+        return
+    if not _finish(job_id, doc_id, chunks=chunks, meta=meta):
+        # Document was deleted while indexing: drop the vectors we just wrote
+        drop_doc_chunks(user_id, doc_id)
+    invalidate_docs(user_id, [doc_id])
+
+
+_inflight: Dict[str, "asyncio.Future[None]"] = {}
+
+
+def submit_ingest_job(job_id: str, tmp_path: str, filename: str, user_id: str, doc_id: str) -> None:
+    """Queue a job on the ingest pool. Raises 503 when the pool queue is full."""
+    fut = ingest_pool.submit(run_ingest_job, job_id, tmp_path, filename, user_id, doc_id)
+    _inflight[job_id] = fut
+    fut.add_done_callback(lambda _f: _inflight.pop(job_id, None))
+
+
+def fail_inflight_jobs(reason: str = "Interrupted by server shutdown.") -> None:
+    """Mark jobs this process accepted but never finished as failed."""
+    for job_id, fut in list(_inflight.items()):
+        if fut.done():
+            continue
+        fut.cancel()
+        with SessionLocal() as s:
+            job = s.get(IngestJob, job_id)
+            if job is None or job.status in ("succeeded", "failed"):
+                continue
+            job.status = "failed"
+            job.error = reason
+            job.updated_at = datetime.utcnow()
+            rec = s.get(FileRecord, job.doc_id)
+            if rec is not None:
+                rec.status = "failed"
+            s.commit()
+    _inflight.clear()
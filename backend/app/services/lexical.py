@@ -0,0 +1,221 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import LEXICAL_INDEX_ENABLED, LEXICAL_INDEX_PATH
+
+# SQLite's default limit on host parameters per statement is 999
+_PARAM_BATCH = 500
+
+# Identifiers such as INV-2024-0042, ERR_TIMEOUT or sku_123 stay one token
+_TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '-_'"
+_TERM_RE = re.compile(r"[\w\-]+", re.UNICODE)
+
+# (chunk_id, text, metadata, bm25 score) — lower score ranks higher
+LexicalHit = Tuple[str, str, Dict[str, Any], float]
+
+
+def query_terms(query: str) -> List[str]:
+    return [t for t in (m.strip("-_") for m in _TERM_RE.findall(query)) if t]
+
+
+def _match_expr(terms: Sequence[str]) -> str:
+    # Quote every term so FTS5 operators and punctuation in user input are inert
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def is_identifier(term: str) -> bool:
+    """
+    Mixes in digits or `-`/`_` (ERR42, INV-2024, sku_123). Plain upper-case
+    words don't count: "THE", "PDF" or "HOW" are not lookups.
+    """
+    return any(ch.isdigit() for ch in term) or "-" in term or "_" in term
+
+
+def identifier_terms(query: str) -> List[str]:
+    return [t for t in query_terms(query) if is_identifier(t)]
+
+
+def is_keyword_query(query: str) -> bool:
+    """
+    True for short lookups of identifiers (invoice numbers, SKUs, error codes),
+    where exact term matching beats dense retrieval: at most three terms, at
+    least one of which is an identifier.
+    """
+    terms = query_terms(query)
+    return 0 < len(terms) <= 3 and any(is_identifier(t) for t in terms)
+
+
+class LexicalIndex:
+    """
+    SQLite FTS5 index over chunk text, kept next to the app database. Rows
+    mirror the chunks in Chroma (same ids and metadata) and are searched
+    with BM25, scoped to one user's documents.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self.searches = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+                " text, chunk_id UNINDEXED, user_id UNINDEXED, doc_id UNINDEXED,"
+                f" meta UNINDEXED, tokenize = \"{_TOKENIZER}\")"
+            )
+            # Counted once here, then kept up to date so stats() never scans the table
+            self.rows = self._conn.execute("SELECT COUNT(*) FROM chunks_fts").fetchone()[0]
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        rows = [
+            (t, i, m.get("user_id"), m.get("doc_id"), json.dumps(m, ensure_ascii=False))
+            for i, t, m in zip(ids, texts, metadatas)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO chunks_fts (text, chunk_id, user_id, doc_id, meta) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+            self.rows += len(rows)
+
+    def search(
+        self, user_id: str, doc_ids: Sequence[str], query: str, limit: int, identifiers_only: bool = False
+    ) -> List[LexicalHit]:
+        # identifiers_only: match on the codes alone, so that "what is ERR-42"
+        # doesn't rank every chunk containing "what" or "is"
+        terms = identifier_terms(query) if identifiers_only else query_terms(query)
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not terms or not doc_ids or limit <= 0:
+            return []
+        hits: List[LexicalHit] = []
+        with self._lock:
+            self.searches += 1
+            for i in range(0, len(doc_ids), _PARAM_BATCH):
+                part = doc_ids[i : i + _PARAM_BATCH]
+                rows = self._conn.execute(
+                    "SELECT chunk_id, text, meta, bm25(chunks_fts) AS score FROM chunks_fts"
+                    f" WHERE chunks_fts MATCH ? AND user_id = ? AND doc_id IN ({','.join('?' * len(part))})"
+                    " ORDER BY score LIMIT ?",
+                    [_match_expr(terms), user_id, *part, limit],
+                ).fetchall()
+                hits.extend((cid, text, json.loads(meta), score) for cid, text, meta, score in rows)
+        hits.sort(key=lambda h: h[3])
+        return hits[:limit]
+
+    def delete_doc(self, user_id: str, doc_id: str) -> None:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM chunks_fts WHERE user_id = ? AND doc_id = ?", (user_id, doc_id)
+            )
+            self.rows -= max(0, cur.rowcount)
+
+    def delete_user(self, user_id: str) -> None:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM chunks_fts WHERE user_id = ?", (user_id,))
+            self.rows -= max(0, cur.rowcount)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks_fts")
+            self.rows = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "chunks": self.rows, "searches": self.searches}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_disabled_reason: Optional[str] = None
+
+
+def _open() -> Optional[LexicalIndex]:
+    global _disabled_reason
+    if not LEXICAL_INDEX_ENABLED:
+        _disabled_reason = "LEXICAL_INDEX_ENABLED=false"
+        return None
+    try:
+        return LexicalIndex(LEXICAL_INDEX_PATH)
+    except sqlite3.OperationalError as e:
+        # e.g. SQLite built without FTS5: retrieval stays vector-only
+        _disabled_reason = str(e)
+        return None
+
+
+LEXICAL: Optional[LexicalIndex] = _open()
+
+
+def lexical_enabled() -> bool:
+    return LEXICAL is not None
+
+
+def index_chunks(ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+    if LEXICAL is not None:
+        LEXICAL.add(ids, texts, metadatas)
+
+
+def search_chunks(
+    user_id: str, doc_ids: Sequence[str], query: str, limit: int, identifiers_only: bool = False
+) -> List[LexicalHit]:
+    if LEXICAL is None:
+        return []
+    return LEXICAL.search(user_id, doc_ids, query, limit, identifiers_only)
+
+
+def delete_doc_chunks(user_id: str, doc_id: str) -> None:
+    if LEXICAL is not None:
+        LEXICAL.delete_doc(user_id, doc_id)
+
+
+def delete_user_chunks(user_id: str) -> None:
+    if LEXICAL is not None:
+        LEXICAL.delete_user(user_id)
+
+
+def clear_index() -> None:
+    if LEXICAL is not None:
+        LEXICAL.clear()
+
+
+def lexical_stats() -> Dict[str, Any]:
+    if LEXICAL is None:
+        return {"enabled": False, "reason": _disabled_reason}
+    return {"enabled": True, **LEXICAL.stats()}
+
+
+def rebuild_from_store(batch: int = 500) -> int:
+    """Re-create the index from every chunk in Chroma (e.g. for documents indexed before it existed)."""
+    from .vectorstore import get_store
+
+    if LEXICAL is None:
+        return 0
+    LEXICAL.clear()
+    total = 0
+    for coll in get_store().all_collections():
+        offset = 0
+        while True:
+            r = coll.get(include=["documents", "metadatas"], limit=batch, offset=offset)
+            ids = r.get("ids") or []
+            if not ids:
+                break
+            offset += len(ids)
+            LEXICAL.add(ids, r.get("documents") or [], [m or {} for m in r.get("metadatas") or []])
+            total += len(ids)
+    return total
+
+
+if __name__ == "__main__":
+    # python -m app.services.lexical
+    print(f"indexed {rebuild_from_store()} chunks into {LEXICAL_INDEX_PATH}")
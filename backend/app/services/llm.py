@@ -1,31 +1,97 @@
-from typing import Optional, List, Dict, Union
+from typing import Optional, List, Dict, Union, AsyncIterator, Tuple, Any
+import json
+import os
 import httpx
 from fastapi import HTTPException
-from openai import OpenAI
+import time
+from .http_clients import get_clients
+from .metrics import LLM_SECONDS, observe_stream
 from ..config import (
     LLM_PROVIDER,
     LLM_MODEL,
-    LLM_BASE_URL,
     OLLAMA_BASE_URL,
     OPENAI_API_KEY,
 )
 
-# imports (near the top of your file, replace the old OpenAI import)
-from openai import AsyncOpenAI
-from fastapi import HTTPException
-import os
 
+def _use_responses_api(use_responses_api: Optional[bool]) -> bool:
+    # Default to Responses API unless explicitly disabled via env
+    if use_responses_api is None:
+        return os.getenv("OPENAI_USE_RESPONSES_API", "true").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+    return use_responses_api
 
-async def llm_chat_openai_sdk(
+
+def _openai_responses_payload(
     messages,
     model,
-    api_key,
-    temperature: float = 0.2,
-    max_output_tokens: Optional[int] = None,
-    top_p: Optional[float] = None,
-    stop: Optional[Union[List[str], str]] = None,
-    use_responses_api: Optional[bool] = None,
-):
+    temperature: float,
+    max_output_tokens: Optional[int],
+    top_p: Optional[float],
+    stop: Optional[Union[List[str], str]],
+) -> Dict[str, Any]:
+    # Split system messages into 'instructions'; rest go into 'input'
+    instructions = (
+        "\n".join([m["content"] for m in messages if m.get("role") == "system"])
+        or None
+    )
+    input_messages = [
+        {
+            "role": m["role"],
+            "content": [
+                {
+                    # Prior assistant turns are model output, not input
+                    "type": "output_text" if m["role"] == "assistant" else "input_text",
+                    "text": m.get("content", ""),
+                }
+            ],
+        }
+        for m in messages
+        if m.get("role") != "system"
+    ] or [{"role": "user", "content": [{"type": "input_text", "text": ""}]}]
+
+    payload = {
+        "model": model,
+        "input": input_messages,
+        "temperature": temperature,
+    }
+    if instructions:
+        payload["instructions"] = instructions
+    if max_output_tokens is not None:
+        payload["max_output_tokens"] = int(max_output_tokens)
+    if top_p is not None:
+        payload["top_p"] = float(top_p)
+    if stop is not None:
+        payload["stop"] = stop
+    return payload
+
+
+def _openai_chat_payload(
+    messages,
+    model,
+    temperature: float,
+    max_output_tokens: Optional[int],
+    top_p: Optional[float],
+    stop: Optional[Union[List[str], str]],
+) -> Dict[str, Any]:
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+    }
+    if max_output_tokens is not None:
+        payload["max_output_tokens"] = int(max_output_tokens)
+    if top_p is not None:
+        payload["top_p"] = float(top_p)
+    if stop is not None:
+        payload["stop"] = stop
+    return payload
+
+
+def _require_openai_key(api_key: str) -> None:
     if not api_key:
         raise HTTPException(
             400,
@@ -34,63 +100,32 @@ async def llm_chat_openai_sdk(
             },
         )
 
-    # Default to Responses API unless explicitly disabled via env
-    if use_responses_api is None:
-        use_responses_api = os.getenv("OPENAI_USE_RESPONSES_API", "true").lower() in (
-            "1",
-            "true",
-            "yes",
-        )
 
-    client = AsyncOpenAI(api_key=api_key)
+async def llm_chat_openai_sdk(
+    messages,
+    model,
+    api_key,
+    temperature: float = 0.2,
+    max_output_tokens: Optional[int] = None,
+    top_p: Optional[float] = None,
+    stop: Optional[Union[List[str], str]] = None,
+    use_responses_api: Optional[bool] = None,
+):
+    _require_openai_key(api_key)
+    client = get_clients().openai(api_key)
 
     try:
-        if use_responses_api:
-            # Split system messages into 'instructions'; rest go into 'input'
-            instructions = (
-                "\n".join([m["content"] for m in messages if m.get("role") == "system"])
-                or None
+        if _use_responses_api(use_responses_api):
+            payload = _openai_responses_payload(
+                messages, model, temperature, max_output_tokens, top_p, stop
             )
-            input_messages = [
-                {
-                    "role": m["role"],
-                    "content": [{"type": "input_text", "text": m.get("content", "")}],
-                }
-                for m in messages
-                if m.get("role") != "system"
-            ] or [{"role": "user", "content": [{"type": "input_text", "text": ""}]}]
-
-            payload = {
-                "model": model,
-                "input": input_messages,
-                "temperature": temperature,
-            }
-            if instructions:
-                payload["instructions"] = instructions
-            if max_output_tokens is not None:
-                payload["max_output_tokens"] = int(max_output_tokens)
-            if top_p is not None:
-                payload["top_p"] = float(top_p)
-            if stop is not None:
-                payload["stop"] = stop
-
-            print("Max output tokens:", payload["max_output_tokens"])
             resp = await client.responses.create(**payload)
             text = getattr(resp, "output_text", None)
             return text if text is not None else str(resp)
 
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-        }
-        if max_output_tokens is not None:
-            payload["max_output_tokens"] = int(max_output_tokens)
-        if top_p is not None:
-            payload["top_p"] = float(top_p)
-        if stop is not None:
-            payload["stop"] = stop
-
+        payload = _openai_chat_payload(
+            messages, model, temperature, max_output_tokens, top_p, stop
+        )
         resp = await client.chat.completions.create(**payload)
         return resp.choices[0].message.content
 
@@ -98,40 +133,147 @@ async def llm_chat_openai_sdk(
         raise HTTPException(502, {"message": f"OpenAI SDK error: {e}"})
 
 
-async def llm_chat_ollama(
+async def llm_stream_openai_sdk(
     messages,
     model,
+    api_key,
     temperature: float = 0.2,
-    base_url=OLLAMA_BASE_URL,
     max_output_tokens: Optional[int] = None,
     top_p: Optional[float] = None,
     stop: Optional[Union[List[str], str]] = None,
-):
-    url = f"{base_url}/api/chat"
+    use_responses_api: Optional[bool] = None,
+) -> AsyncIterator[str]:
+    """Yield text deltas from the OpenAI SDK as soon as they arrive."""
+    _require_openai_key(api_key)
+    client = get_clients().openai(api_key)
+
+    try:
+        if _use_responses_api(use_responses_api):
+            payload = _openai_responses_payload(
+                messages, model, temperature, max_output_tokens, top_p, stop
+            )
+            stream = await client.responses.create(**payload, stream=True)
+            async for event in stream:
+                if getattr(event, "type", None) == "response.output_text.delta":
+                    delta = getattr(event, "delta", None)
+                    if delta:
+                        yield delta
+            return
+
+        payload = _openai_chat_payload(
+            messages, model, temperature, max_output_tokens, top_p, stop
+        )
+        stream = await client.chat.completions.create(**payload, stream=True)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(502, {"message": f"OpenAI SDK error: {e}"})
+
+
+def _ollama_payload(
+    messages,
+    model,
+    temperature: float,
+    top_p: Optional[float],
+    stop: Optional[Union[List[str], str]],
+    stream: bool,
+) -> Dict[str, Any]:
     options = {"temperature": temperature}
     if top_p is not None:
         options["top_p"] = float(top_p)
     if stop is not None:
         options["stop"] = stop
 
-    payload = {
+    return {
         "model": model,
         "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
         "options": options,
-        "stream": False,
+        "stream": stream,
     }
-    async with httpx.AsyncClient(timeout=120) as client:
-        r = await client.post(url, json=payload)
-        if r.status_code >= 400:
-            raise HTTPException(r.status_code, {"message": f"Ollama error: {r.text}"})
-        data = r.json()
-        if (
-            isinstance(data, dict)
-            and "message" in data
-            and "content" in data["message"]
-        ):
-            return data["message"]["content"]
-        return (data.get("response") or "").strip()
+
+
+async def llm_chat_ollama(
+    messages,
+    model,
+    temperature: float = 0.2,
+    base_url=OLLAMA_BASE_URL,
+    max_output_tokens: Optional[int] = None,
+    top_p: Optional[float] = None,
+    stop: Optional[Union[List[str], str]] = None,
+):
+    url = f"{base_url}/api/chat"
+    payload = _ollama_payload(messages, model, temperature, top_p, stop, stream=False)
+    client = get_clients().http(base_url)
+    r = await client.post(url, json=payload)
+    if r.status_code >= 400:
+        raise HTTPException(r.status_code, {"message": f"Ollama error: {r.text}"})
+    data = r.json()
+    if (
+        isinstance(data, dict)
+        and "message" in data
+        and "content" in data["message"]
+    ):
+        return data["message"]["content"]
+    return (data.get("response") or "").strip()
+
+
+async def llm_stream_ollama(
+    messages,
+    model,
+    temperature: float = 0.2,
+    base_url=OLLAMA_BASE_URL,
+    max_output_tokens: Optional[int] = None,
+    top_p: Optional[float] = None,
+    stop: Optional[Union[List[str], str]] = None,
+) -> AsyncIterator[str]:
+    """Yield text deltas from Ollama's NDJSON stream (`"stream": true`)."""
+    url = f"{base_url}/api/chat"
+    payload = _ollama_payload(messages, model, temperature, top_p, stop, stream=True)
+    client = get_clients().http(base_url)
+    try:
+        async with client.stream("POST", url, json=payload) as r:
+            if r.status_code >= 400:
+                body = (await r.aread()).decode("utf-8", errors="replace")
+                raise HTTPException(r.status_code, {"message": f"Ollama error: {body}"})
+            async for line in r.aiter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                if data.get("error"):
+                    raise HTTPException(502, {"message": f"Ollama error: {data['error']}"})
+                delta = (data.get("message") or {}).get("content") or data.get("response")
+                if delta:
+                    yield delta
+                if data.get("done"):
+                    break
+    except httpx.HTTPError as e:
+        # Connect/read timeouts and dropped connections, possibly mid-stream
+        raise HTTPException(502, {"message": f"Ollama error: {type(e).__name__}: {e}"})
+
+
+def _resolve_provider(
+    provider_override: Optional[str], model_override: Optional[str]
+) -> Tuple[str, str]:
+    provider = (provider_override or LLM_PROVIDER or "").lower()
+    model = model_override or LLM_MODEL
+    if provider not in ("openai", "ollama"):
+        raise HTTPException(
+            400,
+            {
+                "message": f"Unsupported provider '{provider}'. Use 'openai', 'openai_compat', or 'ollama'."
+            },
+        )
+    return provider, model
 
 
 async def llm_chat(
@@ -145,13 +287,35 @@ async def llm_chat(
     stop: Optional[Union[List[str], str]] = None,
     use_responses_api: Optional[bool] = None,
 ):
-    provider = (provider_override or LLM_PROVIDER or "").lower()
-    model = model_override or LLM_MODEL
+    provider, model = _resolve_provider(provider_override, model_override)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        answer = await _llm_chat(
+            provider, model, messages, temperature, openai_key_header,
+            max_output_tokens, top_p, stop, use_responses_api,
+        )
+        outcome = "ok"
+        return answer
+    finally:
+        LLM_SECONDS.observe(
+            time.perf_counter() - start, provider=provider, model=model, stream="false", outcome=outcome
+        )
 
+
+async def _llm_chat(
+    provider: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    openai_key_header: str,
+    max_output_tokens: Optional[int],
+    top_p: Optional[float],
+    stop: Optional[Union[List[str], str]],
+    use_responses_api: Optional[bool],
+):
     if provider == "openai":
-        key = (
-            openai_key_header or DEFAULT_OPENAI_API_KEY
-        )  # or OPENAI_API_KEY if that's your var
+        key = openai_key_header or OPENAI_API_KEY
         return await llm_chat_openai_sdk(
             messages,
             model=model,
@@ -162,8 +326,49 @@ async def llm_chat(
             stop=stop,
             use_responses_api=use_responses_api,
         )
-    if provider == "ollama":
-        return await llm_chat_ollama(
+    return await llm_chat_ollama(
+        messages,
+        model=model,
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+        top_p=top_p,
+        stop=stop,
+    )
+
+
+def llm_chat_stream(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    openai_key_header: str = "",
+    provider_override: Optional[str] = None,
+    model_override: Optional[str] = None,
+    max_output_tokens: Optional[int] = None,
+    top_p: Optional[float] = None,
+    stop: Optional[Union[List[str], str]] = None,
+    use_responses_api: Optional[bool] = None,
+) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of `llm_chat`: returns an async iterator of text deltas.
+    Provider resolution happens eagerly so bad overrides fail before streaming starts.
+    """
+    provider, model = _resolve_provider(provider_override, model_override)
+    start = time.perf_counter()
+
+    if provider == "openai":
+        key = openai_key_header or OPENAI_API_KEY
+        _require_openai_key(key)
+        deltas = llm_stream_openai_sdk(
+            messages,
+            model=model,
+            api_key=key,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            top_p=top_p,
+            stop=stop,
+            use_responses_api=use_responses_api,
+        )
+    else:
+        deltas = llm_stream_ollama(
             messages,
             model=model,
             temperature=temperature,
@@ -171,10 +376,4 @@ async def llm_chat(
             top_p=top_p,
             stop=stop,
         )
-
-    raise HTTPException(
-        400,
-        {
-            "message": f"Unsupported provider '{provider}'. Use 'openai', 'openai_compat', or 'ollama'."
-        },
-    )
+    return observe_stream(deltas, provider, model, start)
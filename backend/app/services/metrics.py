@@ -0,0 +1,106 @@
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..utils.metrics import Registry, sample_lines
+
+REGISTRY = Registry()
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "rag_http_request_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+PARSE_SECONDS = REGISTRY.histogram(
+    "rag_ingest_parse_seconds", "Text extraction time per uploaded document.", ("file_type",)
+)
+CHUNK_SECONDS = REGISTRY.histogram(
+    "rag_ingest_chunk_seconds", "Chunking time per uploaded document.", ("file_type",)
+)
+INGEST_CHUNKS = REGISTRY.counter(
+    "rag_ingest_chunks_total", "Chunks written by ingestion.", ("file_type",)
+)
+EMBED_SECONDS = REGISTRY.histogram(
+    "rag_embed_batch_seconds", "Embedding model latency per encode() batch."
+)
+EMBED_BATCH_SIZE = REGISTRY.histogram(
+    "rag_embed_batch_size", "Texts per embedding model batch.", buckets=BATCH_BUCKETS
+)
+EMBED_CALL_SECONDS = REGISTRY.histogram(
+    "rag_embed_seconds", "embed() latency including the cache, by priority.", ("priority",)
+)
+VECTOR_SECONDS = REGISTRY.histogram(
+    "rag_vectorstore_seconds", "Chroma call latency.", ("op",)
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "rag_llm_seconds", "LLM call latency until the full answer.",
+    ("provider", "model", "stream", "outcome"),
+)
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "rag_llm_time_to_first_token_seconds", "Streaming LLM latency until the first delta.",
+    ("provider", "model"),
+)
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    "rag_db_commit_seconds", "SQLAlchemy session commit time (flush included)."
+)
+
+
+async def observe_stream(
+    deltas: AsyncIterator[str], provider: str, model: str, start: float
+) -> AsyncIterator[str]:
+    """Pass deltas through, recording time to first token and total stream time since `start`."""
+    first = True
+    outcome = "error"
+    try:
+        async for delta in deltas:
+            if first:
+                LLM_TTFT_SECONDS.observe(time.perf_counter() - start, provider=provider, model=model)
+                first = False
+            yield delta
+        outcome = "ok"
+    finally:
+        LLM_SECONDS.observe(
+            time.perf_counter() - start, provider=provider, model=model, stream="true", outcome=outcome
+        )
+
+
+# DB commits: the start time rides on the session between the two events
+@event.listens_for(Session, "before_commit")
+def _commit_started(session: Session) -> None:
+    session.info["_commit_t0"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session: Session) -> None:
+    t0 = session.info.pop("_commit_t0", None)
+    if t0 is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - t0)
+
+
+def _cache_samples() -> List[str]:
+    # Hit/miss counters of the in-process caches; rate() them for hit ratios
+    from .embeddings import embedding_cache_stats
+    from .retrieval import query_cache_stats
+    from .rerank import SCORES
+    from .identity import identity_stats
+
+    stats: Dict[str, Optional[Dict[str, Any]]] = {
+        "embedding": embedding_cache_stats(),
+        **query_cache_stats(),
+        "rerank_scores": SCORES.stats(),
+        **identity_stats(),
+    }
+    hits = {name: s["hits"] for name, s in stats.items() if s}
+    misses = {name: s["misses"] for name, s in stats.items() if s}
+    return [
+        *sample_lines("rag_cache_hits_total", "counter", "Cache hits.", "cache", hits),
+        *sample_lines("rag_cache_misses_total", "counter", "Cache misses.", "cache", misses),
+    ]
+
+
+REGISTRY.add_collector(_cache_samples)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -1,67 +1,202 @@
-import os, pandas as pd
-from typing import List, Dict, Any, Tuple
-from pypdf import PdfReader
-import docx2txt
-from ..config import OCR_ENABLED
+import os
+import multiprocessing
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Tuple, Iterator, Deque
+from ..config import (
+    PDF_PARALLEL_WORKERS,
+    PDF_PARALLEL_MIN_PAGES,
+    PDF_PAGES_PER_TASK,
+    CSV_READ_ROWS,
+)
+from .chunking import CHUNK_SIZE
+
+# pandas, pypdf and docx2txt are imported inside the extractors that need them
+# so importing the app doesn't pay for every parser up front.
 
 try:
-    from PIL import Image
+    import PIL  # noqa: F401
 
     OCR_AVAILABLE = True
 except Exception:
     OCR_AVAILABLE = False
-    Image = None
 
 
-def _extract_pdf_text(path: str) -> Tuple[List[Dict[str, Any]], int]:
+# Per process: the reader of the PDF this process is working through, so the
+# page ranges of one document don't each re-parse its xref and page tree.
+# Keyed on size and mtime as well, since spool paths can be reused.
+_READERS: "OrderedDict[Tuple[str, int, int], Any]" = OrderedDict()
+_READERS_MAX = 2
+_readers_lock = threading.Lock()
+
+
+def _pdf_reader(path: str):
+    from pypdf import PdfReader
+
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _readers_lock:
+        reader = _READERS.get(key)
+        if reader is not None:
+            _READERS.move_to_end(key)
+            return reader
+    reader = PdfReader(path)
+    with _readers_lock:
+        _READERS[key] = reader
+        while len(_READERS) > _READERS_MAX:
+            _READERS.popitem(last=False)
+    return reader
+
+
+def _extract_pdf_pages(path: str, start: int, end: int, source: str,
+                       cached: bool = True) -> List[Dict[str, Any]]:
+    """Text blobs for 0-based pages [start, end). Top-level so worker processes can run it."""
+    from pypdf import PdfReader
+
     out = []
+    reader = _pdf_reader(path) if cached else PdfReader(path)
+    for i in range(start, end):
+        text = reader.pages[i].extract_text() or ""
+        if text.strip():
+            out.append({"text": text, "metadata": {"source": source, "page": i + 1}})
+    return out
+
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                # spawn, not fork: the parent has live threads (executors, torch)
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=PDF_PARALLEL_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_pdf_text(path: str, meta: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    from pypdf import PdfReader
+
     reader = PdfReader(path)
     page_count = len(reader.pages)
-    for i, page in enumerate(reader.pages, start=1):
-        text = page.extract_text() or ""
-        if text.strip():
-            out.append(
-                {
-                    "text": text,
-                    "metadata": {"source": os.path.basename(path), "page": i},
-                }
-            )
-    return out, page_count
+    meta["page_count"] = page_count
+    source = os.path.basename(path)
+    if PDF_PARALLEL_WORKERS <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for i, page in enumerate(reader.pages, start=1):
+            text = page.extract_text() or ""
+            if text.strip():
+                yield {"text": text, "metadata": {"source": source, "page": i}}
+        return
+    del reader
+
+    # Page ranges run across worker processes. Only a small window of ranges is
+    # in flight, and results are yielded strictly in page order.
+    step = max(1, PDF_PAGES_PER_TASK)
+    ranges = deque((s, min(s + step, page_count)) for s in range(0, page_count, step))
+    window = 2 * PDF_PARALLEL_WORKERS
+    pending: Deque[Tuple[int, Future]] = deque()
+    done_until = 0
+    try:
+        pool = _get_pdf_pool()
+        while ranges or pending:
+            while ranges and len(pending) < window:
+                start, end = ranges.popleft()
+                pending.append((end, pool.submit(_extract_pdf_pages, path, start, end, source)))
+            end, fut = pending.popleft()
+            yield from fut.result()
+            done_until = end
+    except BrokenProcessPool:
+        shutdown_pdf_pool()
+        # Resume serially after the last range already yielded
+        yield from _extract_pdf_pages(path, done_until, page_count, source, cached=False)
+    finally:
+        # Consumer stopped early or failed: don't leave ranges queued in the pool
+        for _, f in pending:
+            f.cancel()
 
 
-def _extract_docx(path: str) -> List[Dict[str, Any]]:
+def _iter_docx(path: str) -> Iterator[Dict[str, Any]]:
+    import docx2txt
+
     text = docx2txt.process(path) or ""
-    return (
-        [{"text": text, "metadata": {"source": os.path.basename(path)}}]
-        if text.strip()
-        else []
-    )
+    if text.strip():
+        yield {"text": text, "metadata": {"source": os.path.basename(path)}}
 
 
-def _extract_csv(path: str) -> List[Dict[str, Any]]:
-    df = pd.read_csv(path, dtype=str, keep_default_na=False)
-    lines = df.astype(str).agg(" | ".join, axis=1).tolist()
-    text = "\n".join(lines)
-    return (
-        [{"text": text, "metadata": {"source": os.path.basename(path)}}]
-        if text.strip()
-        else []
-    )
+def _csv_blob(source: str, header: str, rows: List[str], row_start: int) -> Dict[str, Any]:
+    text = header + "\n" + "\n".join(rows)
+    return {
+        "text": text,
+        "metadata": {"source": source, "row_start": row_start, "row_end": row_start + len(rows) - 1},
+        # Already sized for the chunker; an oversized single row is still split by it
+        "prechunked": len(text) <= CHUNK_SIZE,
+    }
+
+
+def _iter_csv(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream a CSV in CSV_READ_ROWS batches and pack whole rows into chunk-sized
+    blobs, each starting with the header line. Rows are numbered from 1 (the
+    first data row), so `row_start`/`row_end` are stable across re-uploads.
+    """
+    import pandas as pd
+
+    source = os.path.basename(path)
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=max(1, CSV_READ_ROWS))
+    header = None
+    rows: List[str] = []
+    size = 0
+    row_no = 0
+    row_start = 1
+    for frame in reader:
+        if header is None:
+            header = " | ".join(str(c) for c in frame.columns)
+        for line in frame.astype(str).agg(" | ".join, axis=1):
+            row_no += 1
+            if not line.strip(" |"):
+                continue
+            if rows and len(header) + size + len(line) + 2 > CHUNK_SIZE:
+                yield _csv_blob(source, header, rows, row_start)
+                rows, size = [], 0
+            if not rows:
+                row_start = row_no
+            rows.append(line)
+            size += len(line) + 1
+    if rows:
+        yield _csv_blob(source, header, rows, row_start)
 
 
-def extract_text_blobs(
-    tmp_path: str, filename: str
-) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+def iter_text_blobs(
+    tmp_path: str, filename: str, meta: Dict[str, Any]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield text blobs (pages for PDFs) in document order. File-level
+    metadata is written into `meta` as it becomes known (e.g. `page_count`
+    before the first PDF page). Unsupported types raise 400 immediately.
+    """
     ext = os.path.splitext(filename.lower())[1]
-    meta: Dict[str, Any] = {"source": os.path.basename(filename)}
+    meta.setdefault("source", os.path.basename(filename))
     if ext == ".pdf":
-        blobs, page_count = _extract_pdf_text(tmp_path)
-        meta["page_count"] = page_count
-        return blobs, meta
+        return _iter_pdf_text(tmp_path, meta)
     if ext == ".docx":
-        return _extract_docx(tmp_path), meta
+        return _iter_docx(tmp_path)
     if ext == ".csv":
-        return _extract_csv(tmp_path), meta
+        return _iter_csv(tmp_path)
 
     from fastapi import HTTPException
     raise HTTPException(
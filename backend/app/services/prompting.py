@@ -49,6 +49,8 @@ def build_rag_messages(
     query: str,
     context_chunks: List[str],
     *,
+    history: Optional[List[Dict[str, str]]] = None,
+    summary: Optional[str] = None,
     # optional knobs for future extensibility (kept simple; safe defaults)
     answer_tone: str = "friendly-analyst",
     max_citations_per_sentence: int = 2,
@@ -57,6 +59,9 @@ def build_rag_messages(
     """
     Build messages for a grounded RAG interaction with a personable reasoning style.
     The system prompt enforces grounding, citations, and a clear OOS fallback.
+    `history` (prior user/assistant turns, oldest first) and `summary` (of the
+    turns before those) only help resolve follow-ups; answers stay grounded
+    in this turn's CONTEXT.
     """
     context_block = _numbered_context(context_chunks)
 
@@ -68,12 +73,20 @@ def build_rag_messages(
         else ""
     )
 
+    history_instruction = (
+        "- Earlier conversation turns are only for understanding what the QUESTION refers to; "
+        "they are not a source of facts.\n"
+        if history or summary
+        else ""
+    )
+
     user_content = (
         f"QUESTION:\n{query.strip()}\n\n"
         "CONTEXT:\n"
         f"{context_block}\n\n"
         "Instructions:\n"
         "- Use ONLY the CONTEXT above to answer.\n"
+        f"{history_instruction}"
         f'- If the answer is not in the CONTEXT, reply exactly: "{OOS_REPLY}".\n'
         "- Cite with [n] where n corresponds to the CONTEXT numbering.\n"
         f"{reasoning_instruction}"
@@ -81,10 +94,16 @@ def build_rag_messages(
         "- Output sections in the order: Answer, Reasoning, Sources."
     )
 
-    return [
-        {"role": "system", "content": DEFAULT_SYSTEM_PROMPT},
-        {"role": "user", "content": user_content},
-    ]
+    messages: List[Dict[str, str]] = [{"role": "system", "content": DEFAULT_SYSTEM_PROMPT}]
+    if summary:
+        messages.append(
+            {"role": "system", "content": f"Summary of earlier conversation turns:\n{summary}"}
+        )
+    for turn in history or []:
+        if turn.get("role") in ("user", "assistant") and turn.get("content"):
+            messages.append({"role": turn["role"], "content": turn["content"]})
+    messages.append({"role": "user", "content": user_content})
+    return messages
 
 
 __all__ = ["OOS_REPLY", "DEFAULT_SYSTEM_PROMPT", "build_rag_messages"]
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from fastapi import HTTPException
+from ..config import (
+    RERANK_MODEL,
+    RERANK_BATCH,
+    RERANK_BUDGET_MS,
+    RERANK_MAX_CHARS,
+    RERANK_CACHE_SIZE,
+)
+from ..utils.cache import LRUCache
+from .embedding_cache import normalize_text
+from .executor import cpu_pool
+
+# Like the embedding model, the cross-encoder (and torch) load on first use
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_reranker():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+
+                _model = CrossEncoder(RERANK_MODEL, device="cpu", max_length=512)
+    return _model
+
+
+def reranker_loaded() -> bool:
+    return _model is not None
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+SCORES = LRUCache(RERANK_CACHE_SIZE)  # (query hash, passage hash) -> score
+_stats = {"calls": 0, "reranked": 0, "fallbacks": 0, "pairs_scored": 0}
+_stats_lock = threading.Lock()  # score_pairs updates them from cpu_pool threads
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def score_pairs(query: str, passages: Sequence[str], deadline: float,
+                known: Optional[Sequence[Optional[float]]] = None) -> Optional[List[float]]:
+    """
+    Cross-encoder scores for (query, passage) pairs, cached per pair and
+    computed in RERANK_BATCH batches. `known` holds scores the caller already
+    looked up (None where missing), so the cache isn't asked twice. Returns
+    None once `deadline` (time.monotonic()) passes; batches already scored
+    stay cached.
+    """
+    qh = _digest(query)
+    keys = [(qh, _digest(p)) for p in passages]
+    scores: List[Optional[float]] = list(known) if known is not None else [SCORES.get(k) for k in keys]
+    todo = [i for i, s in enumerate(scores) if s is None]
+    if todo:
+        model = get_reranker()
+        step = max(1, RERANK_BATCH)
+        for b in range(0, len(todo), step):
+            if time.monotonic() > deadline:
+                return None
+            idx = todo[b : b + step]
+            pairs = [(query, passages[i][:RERANK_MAX_CHARS]) for i in idx]
+            for i, s in zip(idx, model.predict(pairs, batch_size=step, show_progress_bar=False)):
+                scores[i] = float(s)
+                SCORES.put(keys[i], scores[i])
+            _count("pairs_scored", len(idx))
+    return scores  # type: ignore[return-value]
+
+
+async def rerank_order(query: str, passages: Sequence[str],
+                       budget_ms: float = RERANK_BUDGET_MS) -> Optional[List[int]]:
+    """
+    Indices of `passages` from most to least relevant, or None if scoring
+    didn't finish within `budget_ms` (model still loading, CPU pool busy) and
+    the caller should keep retrieval order.
+    """
+    _count("calls")
+    if len(passages) < 2:
+        return list(range(len(passages)))
+    budget = max(0.0, budget_ms) / 1000.0
+    deadline = time.monotonic() + budget
+    qh = _digest(query)
+    scores = [SCORES.get((qh, _digest(p))) for p in passages]
+    if any(s is None for s in scores):
+        try:
+            scores = await asyncio.wait_for(
+                cpu_pool.submit(score_pairs, query, list(passages), deadline, scores), timeout=budget
+            )
+        except (asyncio.TimeoutError, HTTPException):
+            # Over budget, or the CPU pool is saturated (503): not worth failing the turn
+            scores = None
+    if scores is None:
+        _count("fallbacks")
+        return None
+    _count("reranked")
+    # Stable: ties keep retrieval order
+    return sorted(range(len(passages)), key=lambda i: -scores[i])
+
+
+def rerank_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        counts = dict(_stats)
+    return {"model": RERANK_MODEL, "loaded": reranker_loaded(), **counts, "cache": SCORES.stats()}
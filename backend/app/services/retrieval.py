@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from fastapi import HTTPException
+from ..config import (
+    QUERY_EMBED_CACHE_SIZE,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_S,
+    RETRIEVAL_MODE,
+    HYBRID_RRF_K,
+    HYBRID_CANDIDATES,
+)
+from ..utils.cache import LRUCache, TTLCache
+from ..utils.timing import span
+from .embedding_cache import normalize_text
+from .embeddings import embed_async
+from .executor import run_cpu, run_io
+from .lexical import is_keyword_query, lexical_enabled, search_chunks
+from .vectorstore import get_store
+from .exact_index import exact_search
+
+Hits = Tuple[List[Any], List[Dict[str, Any]]]  # (documents, metadatas) in rank order
+Ranked = List[Tuple[str, Any, Dict[str, Any]]]  # (chunk_id, document, metadata) in rank order
+
+RETRIEVAL_MODES = ("auto", "vector", "lexical", "hybrid")
+
+
+class RetrievalCache:
+    """
+    Short-TTL cache of vector search results keyed by
+    (user, sorted doc_ids, query hash, top_k, mode), with a reverse index so every
+    entry touching a document can be dropped when that document changes.
+    The TTL bounds staleness across workers, which don't share invalidations.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize, ttl)
+        self._by_doc: Dict[Tuple[str, str], Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    @staticmethod
+    def make_key(
+        user_id: str, doc_ids: Sequence[str], query: str, top_k: int, mode: str = "vector"
+    ) -> Hashable:
+        qh = hashlib.sha256(normalize_text(query).encode("utf-8")).hexdigest()
+        return (user_id, tuple(sorted(set(doc_ids))), qh, top_k, mode)
+
+    def get(self, key: Hashable) -> Optional[Hits]:
+        return self._cache.get(key)
+
+    def put(self, key: Hashable, value: Hits) -> None:
+        if not self._cache.maxsize:
+            return
+        user_id, doc_ids = key[0], key[1]
+        with self._lock:
+            self._cache.put(key, value)
+            for d in doc_ids:
+                self._by_doc.setdefault((user_id, d), set()).add(key)
+            self._puts += 1
+            if self._puts >= max(64, self._cache.maxsize):
+                self._prune()
+
+    def _prune(self) -> None:
+        # Drop reverse-index references to entries that were evicted or expired
+        self._puts = 0
+        live = self._cache.keys()
+        for ud in list(self._by_doc):
+            keys = self._by_doc[ud] & live
+            if keys:
+                self._by_doc[ud] = keys
+            else:
+                del self._by_doc[ud]
+
+    def invalidate_docs(self, user_id: str, doc_ids: Sequence[str]) -> None:
+        with self._lock:
+            for d in doc_ids:
+                for key in self._by_doc.pop((user_id, d), ()):
+                    self._cache.pop(key)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            for ud in [ud for ud in self._by_doc if ud[0] == user_id]:
+                for key in self._by_doc.pop(ud):
+                    self._cache.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._by_doc.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "ttl_s": self._cache.ttl}
+
+
+QUERY_EMBEDDINGS = LRUCache(QUERY_EMBED_CACHE_SIZE)
+RESULTS = RetrievalCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_S)
+
+
+async def embed_query(query: str) -> np.ndarray:
+    key = normalize_text(query)
+    vec = QUERY_EMBEDDINGS.get(key)
+    if vec is None:
+        with span("embed"):
+            vec = (await embed_async([query]))[0]
+        vec.setflags(write=False)  # shared through the cache
+        QUERY_EMBEDDINGS.put(key, vec)
+    return vec
+
+
+async def _vector_ranked(user_id: str, doc_ids: List[str], query: str, n: int) -> Ranked:
+    q_vec = await embed_query(query)
+    # Small scopes: exact dot products over memory-mapped matrices beat filtered ANN
+    with span("exact_search"):
+        ranked = await run_cpu(exact_search, user_id, doc_ids, q_vec, n)
+    if ranked is not None:
+        return ranked
+    with span("chroma_query"):
+        res = await run_io(get_store().query, user_id, doc_ids, q_vec, n)
+    ids = res.get("ids", [[]])[0] or []
+    docs = res.get("documents", [[]])[0] or []
+    metas = res.get("metadatas", [[]])[0] or []
+    return list(zip(ids, docs, metas))
+
+
+async def _lexical_ranked(
+    user_id: str, doc_ids: List[str], query: str, n: int, identifiers_only: bool = False
+) -> Ranked:
+    with span("lexical"):
+        hits = await run_io(search_chunks, user_id, doc_ids, query, n, identifiers_only)
+    return [(cid, text, meta) for cid, text, meta, _ in hits]
+
+
+def rrf_fuse(rankings: Sequence[Ranked], top_k: int, k: int = HYBRID_RRF_K) -> Ranked:
+    """Reciprocal rank fusion: score(chunk) = sum over rankings of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    items: Dict[str, Tuple[str, Any, Dict[str, Any]]] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item[0]] = scores.get(item[0], 0.0) + 1.0 / (k + rank)
+            items.setdefault(item[0], item)
+    order = sorted(scores, key=scores.get, reverse=True)
+    return [items[cid] for cid in order[:top_k]]
+
+
+def resolve_mode(mode: Optional[str], query: str) -> str:
+    """
+    Map a requested mode to the one actually run. `auto` becomes `keyword`
+    (lexical on the identifier terms, falling back to vector when none of
+    them matches) for identifier lookups and `hybrid` otherwise. Without a
+    lexical index, always `vector`.
+    """
+    requested = (mode or RETRIEVAL_MODE).lower()
+    if requested not in RETRIEVAL_MODES:
+        raise HTTPException(
+            400,
+            {"message": f"Unsupported retrieval_mode: {mode}. Use one of: {', '.join(RETRIEVAL_MODES)}."},
+        )
+    if not lexical_enabled():
+        return "vector"
+    if requested == "auto":
+        return "keyword" if is_keyword_query(query) else "hybrid"
+    return requested
+
+
+async def retrieve(
+    user_id: str, doc_ids: List[str], query: str, top_k: int, mode: Optional[str] = None
+) -> Hits:
+    """Top-k chunks for `query`, restricted to the user's selected documents."""
+    mode = resolve_mode(mode, query)
+    key = RetrievalCache.make_key(user_id, doc_ids, query, top_k, mode)
+    hit = RESULTS.get(key)
+    if hit is not None:
+        return hit
+
+    if mode == "vector":
+        ranked = await _vector_ranked(user_id, doc_ids, query, top_k)
+    elif mode in ("lexical", "keyword"):
+        # A keyword hit never touches the embedding model. Keyword mode matches
+        # the identifiers only; filler words would match nearly every chunk
+        ranked = await _lexical_ranked(user_id, doc_ids, query, top_k, mode == "keyword")
+        if not ranked and mode == "keyword":
+            ranked = await _vector_ranked(user_id, doc_ids, query, top_k)
+    else:
+        n = top_k * max(1, HYBRID_CANDIDATES)
+        dense, sparse = await asyncio.gather(
+            _vector_ranked(user_id, doc_ids, query, n),
+            _lexical_ranked(user_id, doc_ids, query, n),
+        )
+        ranked = rrf_fuse([dense, sparse], top_k)
+
+    docs = [d for _, d, _ in ranked]
+    metas = [m for _, _, m in ranked]
+    RESULTS.put(key, (docs, metas))
+    return docs, metas
+
+
+def invalidate_docs(user_id: str, doc_ids: Sequence[str]) -> None:
+    RESULTS.invalidate_docs(user_id, doc_ids)
+
+
+def invalidate_user(user_id: str) -> None:
+    RESULTS.invalidate_user(user_id)
+
+
+def invalidate_all() -> None:
+    RESULTS.clear()
+
+
+def query_cache_stats() -> Dict[str, Any]:
+    return {"query_embeddings": QUERY_EMBEDDINGS.stats(), "retrieval": RESULTS.stats()}
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import tempfile
+from typing import List, NamedTuple, Optional
+from fastapi import HTTPException, Request
+from ..config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES, UPLOAD_SPOOL_DIR
+from .executor import run_io
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+class SpooledUpload(NamedTuple):
+    path: str
+    size_bytes: int
+    sha256: str
+    filename: str
+    content_type: Optional[str]
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        413,
+        detail={
+            "message": f"File too large. Maximum upload size is {max_bytes} bytes.",
+            "max_bytes": max_bytes,
+        },
+    )
+
+
+def _bad_form(message: str) -> HTTPException:
+    return HTTPException(422, detail={"message": message})
+
+
+def _feed(fn, *args) -> None:
+    # The parser's errors (FormParserError and subclasses) are ValueErrors
+    try:
+        fn(*args)
+    except ValueError as e:
+        raise HTTPException(400, detail={"message": f"Malformed multipart body: {e}"})
+
+
+class _FilePart:
+    """python-multipart callbacks that pick out the data of one file field."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.active = False
+        self.done = False
+        self.pending: List[bytes] = []
+        self.pending_bytes = 0
+        self.size = 0
+        self._headers: dict = {}
+        self._name = b""
+        self._value = b""
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._name.lower()] = self._value
+        self._name = self._value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        if self.done or name != self.field or b"filename" not in options:
+            return
+        self.active = True
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        content_type = self._headers.get(b"content-type")
+        self.content_type = content_type.decode("latin-1") if content_type else None
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.active:
+            self.pending.append(data[start:end])
+            self.pending_bytes += end - start
+            self.size += end - start
+
+    def on_part_end(self) -> None:
+        if self.active:
+            self.active = False
+            self.done = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.pending)
+        self.pending.clear()
+        self.pending_bytes = 0
+        return data
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+
+async def spool_upload(
+    request: Request, field: str = "file", max_bytes: int = MAX_UPLOAD_BYTES
+) -> SpooledUpload:
+    """
+    Stream the `field` file of a multipart request body straight into a temp
+    file (keeping the upload's extension) in writes of about
+    `UPLOAD_CHUNK_BYTES`, computing SHA-256 on the fly. The body hits the
+    disk once, here, rather than being spooled by the form parser first, and
+    is aborted with 413 as soon as `max_bytes` is exceeded, Content-Length or
+    not. The caller owns (and must remove) the returned path.
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise _bad_form(f"Expected a multipart/form-data body with a '{field}' field.")
+
+    part = _FilePart(field)
+    parser = MultipartParser(boundary, part.callbacks())
+    digest = hashlib.sha256()
+    out = None
+    path = None
+
+    async def flush() -> None:
+        data = part.take()
+        digest.update(data)
+        await run_io(out.write, data)
+
+    try:
+        async for chunk in request.stream():
+            _feed(parser.write, chunk)
+            if max_bytes and part.size > max_bytes:
+                raise too_large(max_bytes)
+            if out is None and part.filename is not None:
+                fd, path = tempfile.mkstemp(
+                    suffix=os.path.splitext(part.filename)[1], dir=UPLOAD_SPOOL_DIR
+                )
+                out = os.fdopen(fd, "wb")
+            if part.pending_bytes >= UPLOAD_CHUNK_BYTES:
+                await flush()
+        _feed(parser.finalize)
+        if out is None:
+            raise _bad_form(f"Missing the multipart file field '{field}'.")
+        await flush()
+        out.close()
+    except BaseException:
+        if out is not None:
+            out.close()
+        if path is not None:
+            discard_spool(path)
+        raise
+    return SpooledUpload(
+        path=path,
+        size_bytes=part.size,
+        sha256=digest.hexdigest(),
+        filename=part.filename,
+        content_type=part.content_type,
+    )
+
+
+def discard_spool(path: str) -> None:
+    try:
+        os.remove(path)
+    except Exception:
+        pass
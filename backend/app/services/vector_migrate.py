@@ -0,0 +1,96 @@
+"""
+Move chunks out of the legacy shared `docs` collection into the collections of
+the configured VECTOR_SHARDING mode.
+
+    cd backend
+    VECTOR_SHARDING=user python -m app.services.vector_migrate
+    VECTOR_SHARDING=bucket python -m app.services.vector_migrate --dry-run
+
+Chunks are copied with their ids, documents, metadata and embeddings (nothing
+is re-embedded) and deleted from `docs` batch by batch, so an interrupted run
+can simply be restarted. Chunks without `user_id` metadata are left in place.
+Stop the API (or at least uploads) while migrating.
+"""
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+from .vectorstore import LEGACY_COLLECTION, get_client, get_store
+
+
+def migrate(batch: int = 500, dry_run: bool = False, keep_source: bool = False) -> Dict[str, int]:
+    store = get_store()
+    stats = {"moved": 0, "skipped": 0, "users": 0}
+    if store.mode == "none":
+        return stats
+    if LEGACY_COLLECTION not in [getattr(c, "name", c) for c in get_client().list_collections()]:
+        return stats
+
+    legacy = store.legacy_collection()
+    users = set()
+    offset = 0  # rows left in `docs` ahead of the cursor
+    while True:
+        r = legacy.get(
+            include=["documents", "metadatas", "embeddings"], limit=batch, offset=offset
+        )
+        ids = r.get("ids") or []
+        if not ids:
+            break
+        docs = r.get("documents") or [None] * len(ids)
+        metas = r.get("metadatas") or [{}] * len(ids)
+        embs = r.get("embeddings")
+
+        by_user: Dict[str, List[int]] = defaultdict(list)
+        for i, m in enumerate(metas):
+            uid = (m or {}).get("user_id")
+            if uid:
+                by_user[uid].append(i)
+            else:
+                stats["skipped"] += 1
+        moved = [ids[i] for rows in by_user.values() for i in rows]
+
+        if not dry_run:
+            for uid, rows in by_user.items():
+                # upsert: a restarted run may find chunks it already copied
+                store.collection(uid).upsert(
+                    ids=[ids[i] for i in rows],
+                    documents=[docs[i] for i in rows],
+                    metadatas=[metas[i] for i in rows],
+                    embeddings=[embs[i] for i in rows],
+                )
+            if not keep_source and moved:
+                legacy.delete(ids=moved)
+
+        users.update(by_user)
+        stats["moved"] += len(moved)
+        if dry_run or keep_source:
+            offset += len(ids)
+        else:
+            offset += len(ids) - len(moved)
+
+    stats["users"] = len(users)
+    if not dry_run and not keep_source and legacy.count() == 0:
+        get_client().delete_collection(LEGACY_COLLECTION)
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--dry-run", action="store_true", help="only count what would move")
+    ap.add_argument("--keep-source", action="store_true", help="copy without deleting from `docs`")
+    args = ap.parse_args()
+
+    store = get_store()
+    if store.mode == "none":
+        print("VECTOR_SHARDING is 'none': chunks already live in 'docs', nothing to migrate.")
+        return
+    stats = migrate(args.batch, args.dry_run, args.keep_source)
+    verb = "would move" if args.dry_run else "moved"
+    print(
+        f"[{store.mode}] {verb} {stats['moved']} chunks for {stats['users']} users "
+        f"out of '{LEGACY_COLLECTION}'; {stats['skipped']} without user_id left in place"
+    )
+
+
+if __name__ == "__main__":
+    main()
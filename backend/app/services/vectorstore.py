@@ -1,71 +1,232 @@
-import chromadb
-from typing import Dict, Any, Optional
-from ..config import CHROMA_DIR
+import hashlib
+import shutil
+import pathlib
+import threading
+from typing import Dict, Any, List, Optional, Sequence
+from ..config import CHROMA_DIR, VECTOR_SHARDING, VECTOR_SHARD_BUCKETS
+from .metrics import VECTOR_SECONDS
 
-chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-collection = chroma_client.get_or_create_collection(
-    name="docs", metadata={"hnsw:space": "cosine"}
-)
+# chromadb is imported and the persistent client opened on first use, so that
+# importing the app (tests, workers serving only conversations) stays cheap.
+_client = None
+_lock = threading.Lock()
 
+LEGACY_COLLECTION = "docs"
+SHARDING_MODES = ("none", "user", "bucket")
+_COLLECTION_META = {"hnsw:space": "cosine"}
 
-def count_where(where: Dict[str, Any]) -> Optional[int]:
-    try:
-        r = collection.get(where=where, include=["metadatas"])
-        metas = r.get("metadatas", [])
-        return len(metas) if isinstance(metas, list) else 0
-    except Exception:
-        return None
 
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
 
-def force_delete_doc_chunks(user_id: str, doc_id: str) -> int:
+                _client = chromadb.PersistentClient(path=CHROMA_DIR)
+    return _client
+
+
+def _flat_count(metas) -> int:
+    # Chroma returns List[Dict] for get(); be tolerant of nested shapes
+    if metas and isinstance(metas[0], dict):
+        return len(metas)
+    if metas and isinstance(metas[0], list):
+        return sum(len(x or []) for x in metas)
+    return 0
+
+
+class VectorStore:
     """
-    Delete by where; if any chunks remain, fetch their IDs and delete by ids.
-    Returns the number of remaining chunks after the operation (should be 0).
+    Routes every chunk operation to the Chroma collection that owns a user.
+
+    - `none`: one shared `docs` collection, isolated by `where` filters only.
+    - `user`: one collection per user, so HNSW search never wades through
+      other tenants' vectors.
+    - `bucket`: users hashed into a fixed number of collections, for
+      deployments with too many users for a collection each.
+
+    The `user_id` metadata filter is applied in every mode, so a shared bucket
+    (or a misrouted call) can never leak another user's chunks.
     """
-    where = {"user_id": user_id, "doc_id": doc_id}
-    try:
-        collection.delete(where=where)
-    except Exception:
-        pass
-
-    # Count what's left
-    remaining = 0
-    try:
-        r = collection.get(where=where, include=["metadatas"])
-        metas = r.get("metadatas", []) or []
-        if metas and isinstance(metas[0], dict):
-            remaining = len(metas)
-        elif metas and isinstance(metas[0], list):
-            remaining = sum(len(x or []) for x in metas)
-    except Exception:
-        remaining = 0
-
-    # Fallback: delete by ids if anything remained
-    if remaining > 0:
-        try:
-            r = collection.get(where=where, include=["ids"])
-            ids = r.get("ids", []) or []
-            flat_ids = (
-                ids
-                if ids and isinstance(ids[0], str)
-                else [i for sub in ids for i in (sub or []) if isinstance(i, str)]
+
+    def __init__(self, mode: str = VECTOR_SHARDING, buckets: int = VECTOR_SHARD_BUCKETS):
+        if mode not in SHARDING_MODES:
+            raise ValueError(f"VECTOR_SHARDING must be one of {SHARDING_MODES}, got {mode!r}")
+        self.mode = mode
+        self.buckets = max(1, buckets)
+        self._collections: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def collection_name(self, user_id: str) -> str:
+        if self.mode == "none":
+            return LEGACY_COLLECTION
+        digest = hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+        if self.mode == "user":
+            # Chroma names allow 3-63 chars of [a-zA-Z0-9._-]; user ids may not fit that
+            return f"docs_u_{digest[:32]}"
+        return f"docs_b{int(digest[:8], 16) % self.buckets:04d}"
+
+    def _get(self, name: str):
+        coll = self._collections.get(name)
+        if coll is None:
+            client = get_client()
+            with self._lock:
+                coll = self._collections.get(name)
+                if coll is None:
+                    coll = client.get_or_create_collection(name=name, metadata=_COLLECTION_META)
+                    self._collections[name] = coll
+        return coll
+
+    def collection(self, user_id: str):
+        return self._get(self.collection_name(user_id))
+
+    def legacy_collection(self):
+        return self._get(LEGACY_COLLECTION)
+
+    def all_collections(self) -> List[Any]:
+        """Every chunk collection on disk (the legacy one and all shards)."""
+        names = [getattr(c, "name", c) for c in get_client().list_collections()]
+        return [
+            self._get(n) for n in names if n == LEGACY_COLLECTION or n.startswith("docs_")
+        ]
+
+    def loaded(self) -> bool:
+        return _client is not None
+
+    # ---- chunk operations ----
+
+    def add(self, user_id: str, ids: Sequence[str], documents: Sequence[str],
+            metadatas: Sequence[Dict[str, Any]], embeddings) -> None:
+        coll = self.collection(user_id)
+        with VECTOR_SECONDS.time(op="add"):
+            coll.add(
+                ids=list(ids), documents=list(documents), metadatas=list(metadatas),
+                embeddings=embeddings,
             )
-            if flat_ids:
-                collection.delete(ids=flat_ids)
+
+    def query(self, user_id: str, doc_ids: Sequence[str], query_embedding, n_results: int):
+        where = {"$and": [{"user_id": user_id}, {"doc_id": {"$in": list(doc_ids)}}]}
+        coll = self.collection(user_id)
+        with VECTOR_SECONDS.time(op="query"):
+            return coll.query(
+                query_embeddings=[query_embedding], n_results=n_results, where=where
+            )
+
+    def get(self, user_id: str, doc_id: Optional[str] = None, include: Sequence[str] = ("metadatas",),
+            limit: Optional[int] = None, offset: Optional[int] = None):
+        return self.collection(user_id).get(
+            where=self._where(user_id, doc_id), include=list(include), limit=limit, offset=offset
+        )
+
+    def count(self, user_id: str, doc_id: Optional[str] = None) -> Optional[int]:
+        try:
+            return _flat_count(self.get(user_id, doc_id).get("metadatas", []) or [])
+        except Exception:
+            return None
+
+    def delete_doc(self, user_id: str, doc_id: str) -> int:
+        """
+        Delete by where; if any chunks remain, fetch their IDs and delete by ids.
+        Returns the number of remaining chunks after the operation (should be 0).
+        """
+        coll = self.collection(user_id)
+        where = self._where(user_id, doc_id)
+        try:
+            with VECTOR_SECONDS.time(op="delete"):
+                coll.delete(where=where)
         except Exception:
             pass
+        self._purge_legacy(where)
 
-    # Final verification
-    try:
-        r = collection.get(where=where, include=["metadatas"])
-        metas = r.get("metadatas", []) or []
-        if metas and isinstance(metas[0], dict):
-            remaining = len(metas)
-        elif metas and isinstance(metas[0], list):
-            remaining = sum(len(x or []) for x in metas)
+        # Fallback: delete by ids if anything remained
+        if self.count(user_id, doc_id):
+            try:
+                ids = coll.get(where=where, include=[]).get("ids", []) or []
+                flat_ids = (
+                    ids
+                    if ids and isinstance(ids[0], str)
+                    else [i for sub in ids for i in (sub or []) if isinstance(i, str)]
+                )
+                if flat_ids:
+                    coll.delete(ids=flat_ids)
+            except Exception:
+                pass
+
+        # Final verification
+        return self.count(user_id, doc_id) or 0
+
+    def delete_user(self, user_id: str) -> None:
+        if self.mode == "user":
+            # The whole collection belongs to this user: dropping it beats a filtered delete
+            name = self.collection_name(user_id)
+            with self._lock:
+                self._collections.pop(name, None)
+            try:
+                get_client().delete_collection(name)
+            except Exception:
+                pass
         else:
-            remaining = 0
-    except Exception:
-        remaining = 0
+            try:
+                self.collection(user_id).delete(where={"user_id": user_id})
+            except Exception:
+                pass
+        self._purge_legacy({"user_id": user_id})
+
+    def _purge_legacy(self, where: Dict[str, Any]) -> None:
+        # Sharded mode: also drop chunks vector_migrate has not moved out of `docs` yet
+        if self.mode == "none":
+            return
+        try:
+            if LEGACY_COLLECTION in self._list_names():
+                self.legacy_collection().delete(where=where)
+        except Exception:
+            pass
+
+    def reset(self) -> None:
+        """Drop every vector: reset the client, wipe CHROMA_DIR and reopen lazily."""
+        global _client
+        with _lock:
+            if _client is not None:
+                try:
+                    _client.reset()
+                except Exception:
+                    pass
+            _client = None
+            with self._lock:
+                self._collections.clear()
+
+            chroma_path = pathlib.Path(CHROMA_DIR)
+            if chroma_path.exists():
+                shutil.rmtree(chroma_path, ignore_errors=True)
+            chroma_path.mkdir(parents=True, exist_ok=True)
+
+            try:
+                # chromadb caches one System per path; drop it so the next client is fresh
+                from chromadb.api.client import SharedSystemClient
+
+                SharedSystemClient.clear_system_cache()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _where(user_id: str, doc_id: Optional[str] = None) -> Dict[str, Any]:
+        if doc_id is None:
+            return {"user_id": user_id}
+        return {"$and": [{"user_id": user_id}, {"doc_id": doc_id}]}
+
+    @staticmethod
+    def _list_names() -> List[str]:
+        return [getattr(c, "name", c) for c in get_client().list_collections()]
+
+
+_store = VectorStore()
+
+
+def get_store() -> VectorStore:
+    return _store
+
+
+def store_loaded() -> bool:
+    return _store.loaded()
 
-    return remaining
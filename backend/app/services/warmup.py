@@ -0,0 +1,46 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+from ..config import RERANK_ENABLED
+from .embeddings import get_model, model_loaded
+from .vectorstore import get_client, store_loaded
+from .rerank import get_reranker
+
+_state: Dict[str, Any] = {"status": "idle", "error": None, "seconds": None}
+_lock = threading.Lock()
+
+
+def warm_up() -> None:
+    """Load the vector store and embedding model and run one tiny encode."""
+    with _lock:
+        if _state["status"] in ("running", "done"):
+            return
+        _state.update(status="running", error=None)
+    t0 = time.perf_counter()
+    try:
+        get_client()
+        get_model().encode(["warm-up"], normalize_embeddings=True)
+        if RERANK_ENABLED:
+            get_reranker().predict([("warm-up", "warm-up")], show_progress_bar=False)
+    except Exception as e:
+        _state.update(status="failed", error=f"{e.__class__.__name__}: {e}")
+    else:
+        _state.update(status="done")
+    finally:
+        _state["seconds"] = round(time.perf_counter() - t0, 3)
+
+
+def start_warm_up() -> threading.Thread:
+    # Plain daemon thread: must not hold an executor slot or block shutdown
+    t = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    t.start()
+    return t
+
+
+def readiness() -> Dict[str, Optional[Any]]:
+    return {
+        "ready": model_loaded() and store_loaded(),
+        "model_loaded": model_loaded(),
+        "store_loaded": store_loaded(),
+        "warmup": dict(_state),
+    }
@@ -0,0 +1,40 @@
+from .errors import _shape
+
+
+class MaxUploadSizeMiddleware:
+    """
+    Reject oversized uploads from their Content-Length before the multipart
+    body is read at all. Bodies without a length are still capped while
+    streaming to disk (see `services.uploads.spool_upload`).
+    """
+
+    def __init__(self, app, max_bytes: int, path: str = "/v1/files"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path = path.rstrip("/")
+
+    async def __call__(self, scope, receive, send):
+        if (
+            self.max_bytes
+            and scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"].rstrip("/") == self.path
+        ):
+            for name, value in scope.get("headers") or []:
+                if name == b"content-length":
+                    try:
+                        length = int(value)
+                    except ValueError:
+                        break
+                    # Allow a little slack for multipart boundaries and part headers
+                    if length > self.max_bytes + 64 * 1024:
+                        response = _shape(
+                            413,
+                            "HTTP_413",
+                            f"File too large. Maximum upload size is {self.max_bytes} bytes.",
+                            {"max_bytes": self.max_bytes},
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
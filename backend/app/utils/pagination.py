@@ -0,0 +1,28 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(ts: datetime, row_id: str) -> str:
+    """Opaque keyset cursor for the (timestamp, id) of the last row of a page."""
+    raw = json.dumps([ts.isoformat(), row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), str(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(400, detail={"message": "Invalid cursor."})
+
+
+def before(ts_col, id_col, cursor: str):
+    """Rows strictly after `cursor` in (ts_col DESC, id_col DESC) order."""
+    ts, row_id = decode_cursor(cursor)
+    return or_(ts_col < ts, and_(ts_col == ts, id_col < row_id))
@@ -0,0 +1,95 @@
+import asyncio
+import importlib.util
+import os
+import random
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profiles a random `sample_rate` share of requests under `path_prefix` with
+    pyinstrument's statistical sampler and writes an HTML report to `out_dir`
+    for each one that took at least `slow_ms`. pyinstrument is optional: when
+    it isn't installed the middleware passes requests through and says so in
+    `stats()`.
+    """
+
+    def __init__(self, app, out_dir: str, sample_rate: float = 1.0, slow_ms: float = 1000.0,
+                 interval_ms: float = 1.0, path_prefix: str = "/v1/"):
+        self.app = app
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = max(0.0001, interval_ms / 1000.0)
+        self.path_prefix = path_prefix
+        self.disabled_reason: Optional[str] = None
+        self.profiled = 0
+        self.written = 0
+        if importlib.util.find_spec("pyinstrument") is None:
+            self.disabled_reason = "pyinstrument is not installed"
+        else:
+            os.makedirs(out_dir, exist_ok=True)
+        _MIDDLEWARES.append(self)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            self.disabled_reason
+            or scope["type"] != "http"
+            or not scope["path"].startswith(self.path_prefix)
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        # async_mode="enabled": only this request's task, not whatever else the loop runs
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            self.profiled += 1
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            if elapsed_ms >= self.slow_ms:
+                # Rendering the report takes a while; keep it off the event loop
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._write, profiler, scope, elapsed_ms
+                )
+
+    def _write(self, profiler, scope, elapsed_ms: float) -> None:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S.%f")
+        path = _UNSAFE.sub("_", scope["path"]).strip("_") or "root"
+        name = f"{stamp}_{scope['method']}_{path}_{int(elapsed_ms)}ms.html"
+        try:
+            with open(os.path.join(self.out_dir, name), "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            self.written += 1
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.disabled_reason is None,
+            "disabled_reason": self.disabled_reason,
+            "dir": self.out_dir,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "profiled": self.profiled,
+            "written": self.written,
+        }
+
+
+_MIDDLEWARES: list = []
+
+
+def profiler_stats() -> Optional[Dict[str, Any]]:
+    """Stats of the installed profiler middleware, or None when PROFILE_ENABLED is off."""
+    return _MIDDLEWARES[-1].stats() if _MIDDLEWARES else None
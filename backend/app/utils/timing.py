@@ -0,0 +1,71 @@
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+# Request-scoped span durations (ms) by name. The dict is created per request by
+# TimingMiddleware and shared by reference: asyncio tasks and the executor pools
+# copy the context, so spans recorded there land in the same dict.
+_SPANS: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_spans", default=None)
+
+_TOKEN = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def add_span(name: str, seconds: float) -> None:
+    """Add `seconds` to span `name` of the current request (no-op outside one)."""
+    spans = _SPANS.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + seconds * 1000.0
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - start)
+
+
+def current_timings() -> Dict[str, float]:
+    """Span durations so far, in ms, rounded for display."""
+    return {k: round(v, 2) for k, v in (_SPANS.get() or {}).items()}
+
+
+def server_timing(spans: Dict[str, float]) -> str:
+    return ", ".join(f"{_TOKEN.sub('_', name)};dur={ms:.2f}" for name, ms in spans.items())
+
+
+class TimingMiddleware:
+    """
+    Collects spans for each HTTP request (read back by `current_timings`) and,
+    with `header` on, reports them plus `total` up to the response headers in
+    a `Server-Timing` header. For streamed responses only the spans before the
+    first byte make it into the header.
+    """
+
+    def __init__(self, app, header: bool = True):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        spans: Dict[str, float] = {}
+        token = _SPANS.set(spans)
+
+        async def send_wrapper(message):
+            if self.header and message["type"] == "http.response.start":
+                timings = {**spans, "total": (time.perf_counter() - start) * 1000.0}
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _SPANS.reset(token)
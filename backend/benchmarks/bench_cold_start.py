@@ -0,0 +1,76 @@
+"""
+Cold-start cost of the backend: time and peak RSS to `import app.main`, and
+optionally the time until /ready would report ready (model + store loaded).
+
+    cd backend
+    python -m benchmarks.bench_cold_start                 # import only
+    python -m benchmarks.bench_cold_start --ready         # + warm-up
+    python -m benchmarks.bench_cold_start --max-import-s 2.0   # exit 1 on regression
+
+Every run is a fresh interpreter so nothing is shared between samples.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app.main  # noqa: F401
+out = {"import_s": time.perf_counter() - t0}
+if "--ready" in sys.argv:
+    from app.services.warmup import warm_up, readiness
+    warm_up()
+    out["ready_s"] = time.perf_counter() - t0
+    out["ready"] = readiness()["ready"]
+# ru_maxrss is KiB on Linux, bytes on macOS
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+out["peak_rss_mb"] = rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+out["heavy_modules_loaded"] = sorted(
+    m for m in ("torch", "sentence_transformers", "chromadb", "pandas", "pypdf", "openai")
+    if m in sys.modules
+)
+print(json.dumps(out))
+"""
+
+
+def sample(ready: bool) -> dict:
+    env = {**os.environ, "WARMUP_ON_STARTUP": "false"}
+    args = [sys.executable, "-c", CHILD] + (["--ready"] if ready else [])
+    proc = subprocess.run(args, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(proc.returncode)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--ready", action="store_true", help="also measure time until model + store are loaded")
+    ap.add_argument("--max-import-s", type=float, help="fail if median import time exceeds this")
+    args = ap.parse_args()
+
+    samples = [sample(args.ready) for _ in range(args.runs)]
+    imp = [s["import_s"] for s in samples]
+    rss = [s["peak_rss_mb"] for s in samples]
+    print(f"runs: {args.runs}")
+    print(f"import app.main: median {statistics.median(imp):.3f}s  min {min(imp):.3f}s  max {max(imp):.3f}s")
+    print(f"peak RSS after import: median {statistics.median(rss):.1f} MiB")
+    print(f"heavy modules imported: {samples[-1]['heavy_modules_loaded'] or 'none'}")
+    if args.ready:
+        rdy = [s["ready_s"] for s in samples]
+        print(f"time to ready: median {statistics.median(rdy):.3f}s  (ready={samples[-1]['ready']})")
+
+    if args.max_import_s is not None and statistics.median(imp) > args.max_import_s:
+        print(f"FAIL: median import time above {args.max_import_s}s")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
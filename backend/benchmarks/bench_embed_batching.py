@@ -0,0 +1,103 @@
+"""
+Throughput and latency of direct vs micro-batched embedding under concurrency.
+
+    cd backend
+    python -m benchmarks.bench_embed_batching                       # synthetic model
+    python -m benchmarks.bench_embed_batching --model BAAI/bge-m3   # real model
+
+The synthetic model charges a fixed cost per forward pass plus a per-text cost
+and runs one pass at a time, which is how a single CPU/GPU model behaves.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, List, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.embed_batcher import EmbeddingBatcher  # noqa: E402
+
+
+class SyntheticModel:
+    def __init__(self, call_ms: float, per_text_ms: float):
+        self.call_s = call_ms / 1000.0
+        self.per_text_s = per_text_ms / 1000.0
+        self._lock = threading.Lock()
+
+    def encode(self, texts: Sequence[str]):
+        with self._lock:
+            time.sleep(self.call_s + self.per_text_s * len(texts))
+        return [[0.0] for _ in texts]
+
+
+def run(encode: Callable[[List[str]], object], callers: int, requests_per_caller: int):
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker(i: int):
+        mine = []
+        for j in range(requests_per_caller):
+            t0 = time.perf_counter()
+            encode([f"what does clause {i}.{j} say about termination?"])
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(callers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    return len(latencies) / wall, statistics.median(latencies), p99
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", help="SentenceTransformer model name (default: synthetic)")
+    ap.add_argument("--call-ms", type=float, default=20.0, help="synthetic cost per forward pass")
+    ap.add_argument("--per-text-ms", type=float, default=0.5, help="synthetic cost per text")
+    ap.add_argument("--concurrency", default="1,8,64")
+    ap.add_argument("--requests", type=int, default=400, help="total requests per level")
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = ap.parse_args()
+
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(args.model)
+        base = lambda texts: model.encode(list(texts), normalize_embeddings=True)  # noqa: E731
+        # One pass at a time, like the app's single batcher thread
+        gate = threading.Lock()
+
+        def direct(texts):
+            with gate:
+                return base(texts)
+        label = args.model
+    else:
+        direct = SyntheticModel(args.call_ms, args.per_text_ms).encode
+        label = f"synthetic ({args.call_ms}ms/call + {args.per_text_ms}ms/text)"
+
+    batcher = EmbeddingBatcher(direct, args.max_batch, args.max_wait_ms)
+    modes = {"direct": direct, "batched": lambda texts: batcher.encode(texts, "query")}
+
+    print(f"model: {label}; max_batch={args.max_batch} max_wait_ms={args.max_wait_ms}")
+    print(f"{'callers':>8} {'mode':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for callers in [int(c) for c in args.concurrency.split(",")]:
+        per_caller = max(1, args.requests // callers)
+        for name, fn in modes.items():
+            rps, p50, p99 = run(fn, callers, per_caller)
+            print(f"{callers:>8} {name:>8} {rps:>10.1f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f}")
+    batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Latency and recall of scoped retrieval: Chroma filtered HNSW vs the exact
+NumPy engine (app.services.exact_index).
+
+    cd backend
+    python -m benchmarks.bench_exact_search                          # 50k chunks, 384-dim
+    python -m benchmarks.bench_exact_search --corpus 200000 --dim 1024 --scopes 1,5,20
+
+A shared collection holds `--corpus` synthetic chunks split into documents of
+`--doc-chunks` each (clustered vectors, so neighbours are meaningful). Each
+query is scoped to a random set of documents, like a chat with `doc_ids`.
+Recall@k is measured against brute-force ground truth.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.exact_index import ExactIndex  # noqa: E402
+
+USER = "bench-user"
+
+
+def synthetic(n: int, dim: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", type=int, default=50000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--doc-chunks", type=int, default=300)
+    ap.add_argument("--scopes", default="1,3,5", help="documents per query")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=12)
+    args = ap.parse_args()
+
+    import chromadb
+
+    rng = np.random.default_rng(7)
+    vecs = synthetic(args.corpus, args.dim, max(16, args.corpus // 500), rng)
+    n_docs = max(1, args.corpus // args.doc_chunks)
+    doc_of = np.arange(args.corpus) // args.doc_chunks
+    doc_of[doc_of >= n_docs] = n_docs - 1
+    doc_ids = [f"doc-{i:05d}" for i in range(n_docs)]
+
+    tmp = tempfile.mkdtemp(prefix="bench_exact_")
+    client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+    coll = client.get_or_create_collection("docs", metadata={"hnsw:space": "cosine"})
+    exact = ExactIndex(os.path.join(tmp, "exact"), max_chunks=10**9, open_docs=n_docs)
+
+    t0 = time.perf_counter()
+    for d in range(n_docs):
+        rows = np.nonzero(doc_of == d)[0]
+        ids = [f"c{r}" for r in rows]
+        texts = [f"chunk {r}" for r in rows]
+        metas = [{"user_id": USER, "doc_id": doc_ids[d]} for _ in rows]
+        for s in range(0, len(rows), 5000):
+            coll.add(ids=ids[s : s + 5000], documents=texts[s : s + 5000],
+                     metadatas=metas[s : s + 5000], embeddings=vecs[rows[s : s + 5000]])
+        exact.append(USER, doc_ids[d], ids, texts, metas, vecs[rows])
+        exact.finalize(USER, doc_ids[d])
+    print(f"indexed {args.corpus} chunks in {n_docs} docs ({args.dim}-dim) in {time.perf_counter() - t0:.1f}s")
+    print(f"{'docs':>5} {'chunks':>7} {'engine':>7} {'p50 ms':>8} {'p99 ms':>8} {'recall@k':>9}")
+
+    queries = synthetic(args.queries, args.dim, 8, rng)
+    for scope in [int(s) for s in args.scopes.split(",")]:
+        results = {"chroma": ([], []), "exact": ([], [])}
+        scope_rows = 0
+        for q in queries:
+            chosen = rng.choice(n_docs, size=min(scope, n_docs), replace=False)
+            rows = np.nonzero(np.isin(doc_of, chosen))[0]
+            scope_rows = len(rows)
+            truth = {f"c{r}" for r in rows[np.argsort(-(vecs[rows] @ q))[: args.top_k]]}
+            names = [doc_ids[c] for c in chosen]
+
+            t = time.perf_counter()
+            res = coll.query(query_embeddings=[q], n_results=args.top_k,
+                             where={"$and": [{"user_id": USER}, {"doc_id": {"$in": names}}]})
+            lat = time.perf_counter() - t
+            got = set(res["ids"][0])
+            results["chroma"][0].append(lat)
+            results["chroma"][1].append(len(got & truth) / len(truth))
+
+            t = time.perf_counter()
+            ranked = exact.search(USER, names, q, args.top_k)
+            lat = time.perf_counter() - t
+            got = {cid for cid, _, _ in ranked}
+            results["exact"][0].append(lat)
+            results["exact"][1].append(len(got & truth) / len(truth))
+
+        for engine, (lats, recalls) in results.items():
+            print(f"{scope:>5} {scope_rows:>7} {engine:>7} {pct(lats, 0.5) * 1000:>8.2f} "
+                  f"{pct(lats, 0.99) * 1000:>8.2f} {statistics.mean(recalls):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
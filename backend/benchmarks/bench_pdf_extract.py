@@ -0,0 +1,135 @@
+"""
+Pages/second of PDF text extraction: serial vs page ranges on a process pool.
+
+    cd backend
+    python -m benchmarks.bench_pdf_extract                        # 300 and 600 pages
+    python -m benchmarks.bench_pdf_extract --pages 800 --workers 1,2,4,8
+    python -m benchmarks.bench_pdf_extract --pdf some/real.pdf
+
+Synthetic PDFs are written with a minimal PDF writer (one Helvetica text stream
+per page), so only pypdf is needed. Worker runs use the same splitting as
+`app.services.parsers._iter_pdf_text` (PDF_PAGES_PER_TASK pages per task).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.parsers import _extract_pdf_pages  # noqa: E402
+
+LOREM = (
+    "Invoice INV-{p:05d}-{l:02d}: the supplier shall deliver the goods within thirty days "
+    "of the order date, subject to clause {l}.{p} of the master agreement."
+)
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 45) -> None:
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the kids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for p in range(pages):
+        lines = [LOREM.format(p=p, l=l) for l in range(lines_per_page)]
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        ops += [f"({ln}) Tj T*" for ln in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids),
+        pages,
+    )
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for i, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % i + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for off in offsets:
+            f.write(b"%010d 00000 n \n" % off)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def extract(path: str, page_count: int, workers: int, per_task: int, pool=None):
+    source = os.path.basename(path)
+    if workers <= 1:
+        return _extract_pdf_pages(path, 0, page_count, source)
+    starts = list(range(0, page_count, per_task))
+    parts = pool.map(
+        _extract_pdf_pages,
+        [path] * len(starts),
+        starts,
+        [min(s + per_task, page_count) for s in starts],
+        [source] * len(starts),
+    )
+    return [b for part in parts for b in part]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", default="300,600", help="comma-separated synthetic sizes")
+    ap.add_argument("--pdf", help="benchmark an existing PDF instead")
+    ap.add_argument("--workers", default="1,2,4,8")
+    ap.add_argument("--per-task", type=int, default=16)
+    ap.add_argument("--repeat", type=int, default=2)
+    args = ap.parse_args()
+
+    from pypdf import PdfReader
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_pdf_")
+    paths = [args.pdf] if args.pdf else []
+    if not args.pdf:
+        for n in [int(x) for x in args.pages.split(",")]:
+            path = os.path.join(tmpdir, f"synthetic_{n}.pdf")
+            make_pdf(path, n)
+            paths.append(path)
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'pages':>6} {'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+    for path in paths:
+        page_count = len(PdfReader(path).pages)
+        baseline = None
+        expected = None
+        for w in [int(x) for x in args.workers.split(",")]:
+            pool = ProcessPoolExecutor(max_workers=w, mp_context=ctx) if w > 1 else None
+            if pool is not None:
+                # Start the workers outside the timed region, as the app's pool is long-lived
+                list(pool.map(abs, range(w)))
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                blobs = extract(path, page_count, w, args.per_task, pool)
+                best = min(best, time.perf_counter() - t0)
+            if pool is not None:
+                pool.shutdown()
+            pages_seen = [b["metadata"]["page"] for b in blobs]
+            if expected is None:
+                expected = pages_seen
+            assert pages_seen == expected, "page order/metadata differs from serial run"
+            baseline = baseline or best
+            print(f"{page_count:>6} {w:>8} {best:>9.2f} {page_count / best:>9.1f} {baseline / best:>7.2f}x")
+
+    for p in paths:
+        if p.startswith(tmpdir):
+            os.remove(p)
+    os.rmdir(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
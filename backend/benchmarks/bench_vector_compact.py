@@ -0,0 +1,124 @@
+"""
+Recall, latency and memory of compact vector settings for the exact engine:
+scan dtype (float32 / float16 / int8), rescoring, and dimension truncation.
+
+    cd backend
+    python -m benchmarks.bench_vector_compact                           # synthetic 1024-dim
+    python -m benchmarks.bench_vector_compact --vectors emb.npy --dims 1024,512,256
+    python -m benchmarks.bench_vector_compact --model BAAI/bge-m3 --texts corpus.txt
+
+Recall@k is measured against float32 search at full dimension. Synthetic
+vectors get a decaying per-dimension variance, roughly like Matryoshka-trained
+models; truncation numbers only mean something on real embeddings (`--vectors`
+or `--model`). "bytes/vec" is what a scan keeps resident; rescoring reads a
+few float32 rows per query from disk on top of that.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.exact_index import ExactIndex  # noqa: E402
+
+
+def normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return (mat / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+
+def synthetic(n: int, dim: int, rng) -> np.ndarray:
+    spectrum = 1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)
+    centers = rng.normal(size=(max(16, n // 200), dim)) * spectrum
+    x = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.normal(size=(n, dim)) * spectrum
+    return normalize(x)
+
+
+def load_vectors(args, rng) -> np.ndarray:
+    if args.vectors:
+        return normalize(np.load(args.vectors))
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [ln.strip() for ln in f if ln.strip()]
+        model = SentenceTransformer(args.model)
+        return normalize(model.encode(texts, normalize_embeddings=True, batch_size=64))
+    return synthetic(args.chunks + args.queries, args.dim, rng)
+
+
+def conversion_cost(dim: int, batch: int = 64, repeat: int = 200) -> None:
+    mat = np.random.default_rng(0).normal(size=(batch, dim)).astype(np.float32)
+    t = time.perf_counter()
+    for _ in range(repeat):
+        [v.tolist() for v in mat]
+    as_lists = (time.perf_counter() - t) / repeat
+    t = time.perf_counter()
+    for _ in range(repeat):
+        np.asarray(mat, dtype=np.float32)
+    as_array = (time.perf_counter() - t) / repeat
+    print(f"embed() output for {batch}x{dim}: .tolist() {as_lists * 1e3:.3f} ms, "
+          f"ndarray {as_array * 1e3:.4f} ms; list memory ~{batch * dim * 32 / 2**20:.1f} MiB "
+          f"vs {mat.nbytes / 2**20:.2f} MiB\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--vectors", help=".npy of real embeddings (rows = chunks + queries)")
+    ap.add_argument("--model", help="SentenceTransformer model to embed --texts with")
+    ap.add_argument("--texts", help="one text per line, used with --model")
+    ap.add_argument("--chunks", type=int, default=20000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--dim", type=int, default=1024, help="synthetic dimension")
+    ap.add_argument("--dims", default="", help="truncation sizes to try (default: full, 1/2, 1/4)")
+    ap.add_argument("--dtypes", default="float32,float16,int8")
+    ap.add_argument("--top-k", type=int, default=12)
+    ap.add_argument("--rescore-factor", type=int, default=4)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(11)
+    allv = load_vectors(args, rng)
+    n_queries = min(args.queries, len(allv) // 10)
+    queries, corpus = allv[:n_queries], allv[n_queries:]
+    full_dim = corpus.shape[1]
+    dims = [int(d) for d in args.dims.split(",")] if args.dims else [full_dim, full_dim // 2, full_dim // 4]
+
+    conversion_cost(full_dim)
+    truth = [set(np.argsort(-(corpus @ q))[: args.top_k].tolist()) for q in queries]
+    ids = [str(i) for i in range(len(corpus))]
+
+    print(f"{len(corpus)} chunks, {n_queries} queries, k={args.top_k}")
+    print(f"{'dim':>5} {'dtype':>8} {'rescore':>8} {'bytes/vec':>10} {'p50 ms':>8} {'p99 ms':>8} {'recall@k':>9}")
+    for dim in dims:
+        c, qs = normalize(corpus[:, :dim]), normalize(queries[:, :dim])
+        for dtype in args.dtypes.split(","):
+            for rescore in ([False] if dtype == "float32" else [False, True]):
+                ix = ExactIndex(tempfile.mkdtemp(prefix="bench_compact_"), 10**9, 4,
+                                dtype, rescore, args.rescore_factor)
+                for s in range(0, len(c), 5000):
+                    ix.append("u", "d", ids[s : s + 5000], [""] * len(c[s : s + 5000]),
+                              [{}] * len(c[s : s + 5000]), c[s : s + 5000])
+                ix.finalize("u", "d")
+                ix.search("u", ["d"], qs[0], args.top_k)  # open + page in outside the timing
+
+                lats, recalls = [], []
+                for q, t in zip(qs, truth):
+                    t0 = time.perf_counter()
+                    got = ix.search("u", ["d"], q, args.top_k)
+                    lats.append(time.perf_counter() - t0)
+                    recalls.append(len({int(cid) for cid, _, _ in got} & t) / len(t))
+                lats.sort()
+                per_vec = dim * np.dtype(dtype).itemsize + (4 if dtype == "int8" else 0)
+                print(f"{dim:>5} {dtype:>8} {str(rescore):>8} {per_vec:>10} "
+                      f"{statistics.median(lats) * 1e3:>8.2f} {lats[int(0.99 * (len(lats) - 1))] * 1e3:>8.2f} "
+                      f"{statistics.mean(recalls):>9.3f}")
+                ix.clear()
+
+
+if __name__ == "__main__":
+    main()